@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class BlogConfig(AppConfig):
     name = 'blog'
+
+    def ready(self):
+        from blog.jobs import connect_signals
+        from blog.search import connect_signals as connect_search_signals
+        connect_signals()
+        connect_search_signals()
@@ -1,9 +1,12 @@
 from django_cron import CronJobBase, Schedule
 
-from blog.notifications import send_notifications
-from blog.publications import create_publications
+from blog.jobs import run_due_jobs, NOTIFICATION_MODELS, SHARING_MODELS
 
 
+"""
+The run_jobs worker delivers due jobs within seconds. These cron jobs run the same queue as a fallback
+for deployments without a worker, and can safely overlap with it.
+"""
 class SendNotificationsJob(CronJobBase):
     RUN_EVERY_MINS = 1 # every 1 min
 
@@ -11,7 +14,7 @@ class SendNotificationsJob(CronJobBase):
     code = 'blog.send_notifications'    # a unique code
 
     def do(self):
-        send_notifications()
+        run_due_jobs(models=NOTIFICATION_MODELS)
         print('Notifications sent!')
 
 
@@ -22,5 +25,5 @@ class PostPublicationsJob(CronJobBase):
     code = 'blog.post_publications'    # a unique code
 
     def do(self):
-        create_publications()
-        print('Publications posted!')
\ No newline at end of file
+        run_due_jobs(models=SHARING_MODELS)
+        print('Publications posted!')
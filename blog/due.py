@@ -0,0 +1,49 @@
+"""
+Fast check of due jobs, run before `manage.py runcrons` so cron ticks with nothing to do exit without
+booting Django, Wagtail and the social/push clients:
+
+    python -m blog.due && python manage.py runcrons
+
+Exits with 0 when there are due jobs (or when the check can't be done), 1 otherwise.
+It only depends on python-dotenv and psycopg2 and must match the due condition of blog.jobs.claim_jobs.
+"""
+import os
+import sys
+
+
+DUE_JOBS_SQL = """
+SELECT 1 FROM blog_job
+WHERE run_at <= NOW() AND (status = 'PENDING' OR (status = 'RUNNING' AND claimed_at < NOW() - %s * INTERVAL '1 second'))
+LIMIT 1
+"""
+
+
+def has_due_jobs():
+    import psycopg2
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    connection = psycopg2.connect(
+        dbname=os.getenv('DATABASE_USER'),
+        user=os.getenv('DATABASE_USER'),
+        password=os.getenv('DATABASE_PASSWORD'),
+        host=os.getenv('DATABASE_HOST'),
+        port=os.getenv('DATABASE_PORT'),
+        connect_timeout=5,
+    )
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(DUE_JOBS_SQL, [int(os.getenv('JOB_QUEUE_LEASE', 600))])
+            return cursor.fetchone() is not None
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    try:
+        due = has_due_jobs()
+    except Exception as e:
+        # Let runcrons decide when the database can't be checked from here
+        print(e)
+        due = True
+    sys.exit(0 if due else 1)
@@ -0,0 +1,158 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save, post_delete
+from django.utils.timezone import now
+
+from blog.models import Job, EventNotification, NewNotification, BenefitNotification, Sharing
+from notifications.models import DeliveryMixin
+
+"""
+Models delivered through jobs: model -> (run at field, done field)
+"""
+JOB_SCHEDULES = {
+    EventNotification: ('notify_at', 'notified'),
+    NewNotification: ('notify_at', 'notified'),
+    BenefitNotification: ('notify_at', 'notified'),
+}
+
+NOTIFICATION_MODELS = [EventNotification, NewNotification, BenefitNotification]
+SHARING_MODELS = Sharing.get_models()
+
+JOB_SCHEDULES.update({model: ('publish_at', 'published') for model in SHARING_MODELS})
+
+"""
+Seconds after which a running job is considered abandoned (eg: its worker died) and can be claimed again
+"""
+JOB_LEASE = getattr(settings, 'JOB_QUEUE_LEASE', 600)
+
+"""
+Max attempts of a job before it's marked as failed, and seconds to wait between them
+"""
+JOB_MAX_ATTEMPTS = getattr(settings, 'JOB_QUEUE_MAX_ATTEMPTS', 5)
+JOB_RETRY_DELAY = getattr(settings, 'JOB_QUEUE_RETRY_DELAY', 60)
+
+
+def schedule_job(sender, instance, **kwargs):
+    """
+    Creates or updates the job of a notification or sharing when it's saved.
+    """
+    run_at_field, done_field = JOB_SCHEDULES[sender]
+    content_type = ContentType.objects.get_for_model(sender)
+    if getattr(instance, done_field):
+        Job.objects.filter(content_type=content_type, object_id=instance.pk).update(status=Job.STATUS_DONE)
+        return
+    run_at = getattr(instance, run_at_field)
+    job, created = Job.objects.get_or_create(content_type=content_type, object_id=instance.pk,
+                                             defaults={'run_at': run_at})
+    if created:
+        return
+    if job.status == Job.STATUS_FAILED and job.run_at != run_at:
+        # The run date of a failed delivery was edited, it's delivered again
+        Job.objects.filter(pk=job.pk, status=Job.STATUS_FAILED).update(status=Job.STATUS_PENDING, run_at=run_at,
+                                                                       attempts=0)
+        sender.objects.filter(pk=instance.pk, status=DeliveryMixin.STATUS_FAILED)\
+            .update(status=DeliveryMixin.STATUS_PENDING, claimed_at=None)
+    else:
+        # Only reschedule jobs waiting to run, running ones are left as they are
+        Job.objects.filter(pk=job.pk, status=Job.STATUS_PENDING).exclude(run_at=run_at).update(run_at=run_at)
+
+
+def unschedule_job(sender, instance, **kwargs):
+    content_type = ContentType.objects.get_for_model(sender)
+    Job.objects.filter(content_type=content_type, object_id=instance.pk).delete()
+
+
+def connect_signals():
+    for model in JOB_SCHEDULES:
+        post_save.connect(schedule_job, sender=model, dispatch_uid='blog_schedule_job')
+        post_delete.connect(unschedule_job, sender=model, dispatch_uid='blog_unschedule_job')
+
+
+def claim_jobs(limit=20, models=None):
+    """
+    Claims up to limit due jobs. Rows locked by other workers are skipped, so each job is claimed once.
+    """
+    dt_now = now()
+    due = Q(status=Job.STATUS_PENDING) | Q(status=Job.STATUS_RUNNING, claimed_at__lt=dt_now - timedelta(seconds=JOB_LEASE))
+    jobs = Job.objects.filter(due, run_at__lte=dt_now)
+    if models is not None:
+        jobs = jobs.filter(content_type__in=ContentType.objects.get_for_models(*models).values())
+    with transaction.atomic():
+        jobs = list(jobs.select_for_update(skip_locked=True).order_by('run_at')[:limit])
+        Job.objects.filter(pk__in=[job.pk for job in jobs])\
+            .update(status=Job.STATUS_RUNNING, claimed_at=dt_now, attempts=F('attempts') + 1)
+    return jobs
+
+
+def run_jobs(jobs):
+    """
+    Delivers the notifications and sharings of the claimed jobs and records the result of each one.
+    """
+    from blog.notifications import send_notifications
+    from blog.publications import create_publications
+
+    # Content types are cached, so getting the model of each job doesn't query the database
+    models = [ContentType.objects.get_for_id(job.content_type_id).model_class() for job in jobs]
+    ids = defaultdict(list)
+    for job, model in zip(jobs, models):
+        ids[model].append(job.object_id)
+
+    notification_ids = {model: pks for model, pks in ids.items() if model in NOTIFICATION_MODELS}
+    sharing_ids = {model: pks for model, pks in ids.items() if model in SHARING_MODELS}
+    if notification_ids:
+        send_notifications(notification_ids)
+    if sharing_ids:
+        create_publications(sharing_ids)
+
+    done = set()
+    failed = set()
+    run_dates = {}
+    for model, pks in ids.items():
+        run_at_field, done_field = JOB_SCHEDULES[model]
+        rows = model.objects.filter(pk__in=pks).values_list('pk', done_field, 'status', run_at_field)
+        for pk, is_done, status, run_at in rows:
+            if is_done:
+                done.add((model, pk))
+            elif status == DeliveryMixin.STATUS_FAILED:
+                # Rows that may have been sent are never retried
+                failed.add((model, pk))
+            run_dates[(model, pk)] = run_at
+
+    exhausted = defaultdict(list)
+    for job, model in zip(jobs, models):
+        key = (model, job.object_id)
+        if key in done:
+            job.status = Job.STATUS_DONE
+        elif key in failed or job.attempts + 1 >= JOB_MAX_ATTEMPTS:
+            job.status = Job.STATUS_FAILED
+            # Keeps the run date of the row, so editing it delivers the row again
+            job.run_at = run_dates.get(key, job.run_at)
+            if key not in failed:
+                exhausted[model].append(job.object_id)
+        else:
+            job.status = Job.STATUS_PENDING
+            job.run_at = now() + timedelta(seconds=JOB_RETRY_DELAY)
+        Job.objects.filter(pk=job.pk).update(status=job.status, run_at=job.run_at)
+
+    # Rows out of attempts aren't delivered anymore, they're shown as failed instead of pending
+    for model, pks in exhausted.items():
+        model.objects.filter(pk__in=pks, status__in=[DeliveryMixin.STATUS_PENDING, DeliveryMixin.STATUS_CLAIMED])\
+            .update(status=DeliveryMixin.STATUS_FAILED)
+    return len(done)
+
+
+def run_due_jobs(limit=20, models=None):
+    """
+    Claims and runs due jobs until there are no more. Returns the number of delivered jobs.
+    """
+    delivered = 0
+    while True:
+        jobs = claim_jobs(limit, models)
+        if not jobs:
+            return delivered
+        delivered += run_jobs(jobs)
@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+
+"""
+Modules that cron ticks should only load when there is something to deliver
+"""
+HEAVY_MODULES = ['pyfcm', 'twitter', 'PIL.Image', 'social.InstagramAPI', 'requests_toolbelt', 'fcm_django.api']
+
+CRON_ENTRY_POINT = """
+import json, resource, sys, time
+start = time.time()
+import django
+django.setup()
+import blog.cron
+print(json.dumps({
+    'seconds': time.time() - start,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'heavy_modules': [module for module in %r if module in sys.modules],
+}))
+""" % HEAVY_MODULES
+
+
+class Command(BaseCommand):
+    help = 'Measures the cold start (import time and memory) of the cron entry point and of the due jobs pre-check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs',
+                            type=int,
+                            dest='runs',
+                            default=5,
+                            help='Number of fresh processes to measure')
+
+    def run(self, args):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+        start = time.time()
+        result = subprocess.run([sys.executable] + args, cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE)
+        return time.time() - start, result
+
+    def handle(self, *args, **options):
+        runs = options['runs']
+
+        timings = []
+        for i in range(runs):
+            elapsed, result = self.run(['-c', CRON_ENTRY_POINT])
+            data = json.loads(result.stdout.decode('utf-8').strip().splitlines()[-1])
+            timings.append(elapsed)
+        self.stdout.write('Cron entry point: %.3fs per process (setup %.3fs), max RSS %d KB' % (
+            sum(timings) / runs, data['seconds'], data['max_rss_kb']))
+        self.stdout.write('Heavy modules loaded at startup: %s' % (', '.join(data['heavy_modules']) or 'none'))
+
+        timings = []
+        for i in range(runs):
+            elapsed, result = self.run(['-m', 'blog.due'])
+            timings.append(elapsed)
+        self.stdout.write('Due jobs pre-check: %.3fs per process (exit code %d)' % (
+            sum(timings) / runs, result.returncode))
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from blog.jobs import claim_jobs, run_jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs a worker that delivers the scheduled notifications and publications as soon as they are due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once',
+                            action='store_true',
+                            dest='once',
+                            help='Runs the due jobs and exits')
+        parser.add_argument('--interval',
+                            type=float,
+                            dest='interval',
+                            default=getattr(settings, 'JOB_QUEUE_POLL_INTERVAL', 5),
+                            help='Seconds to wait when there are no due jobs')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            dest='batch_size',
+                            default=20,
+                            help='Max number of jobs claimed at once')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            jobs = claim_jobs(options['batch_size'])
+            if jobs:
+                delivered = run_jobs(jobs)
+                self.stdout.write('Delivered %d of %d jobs' % (delivered, len(jobs)))
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
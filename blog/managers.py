@@ -0,0 +1,76 @@
+from itertools import islice
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Count, Q
+from django.db.models.query import ModelIterable
+
+
+"""
+Relations used by the content labels, with the field that tells if the related object was already sent
+"""
+LABEL_RELATIONS = {
+    'notifications': 'notified',
+    'sharings': 'published',
+}
+
+
+def load_label_counts(model, pks):
+    """
+    Counts the notifications and sharings of the given contents per channel, with one aggregate query per relation.
+    Returns a dict like {pk: {(relation, channel): (total, done)}}
+    """
+    counts = {pk: {} for pk in pks}
+    for relation, done_field in LABEL_RELATIONS.items():
+        try:
+            field = model._meta.get_field(relation)
+        except FieldDoesNotExist:
+            continue
+        fk_name = field.field.name
+        rows = field.related_model._base_manager.filter(**{'%s__in' % fk_name: pks})\
+            .values(fk_name, 'channel')\
+            .annotate(total=Count('pk'), done=Count('pk', filter=Q(**{done_field: True})))\
+            .order_by()
+        for row in rows:
+            counts[row[fk_name]][(relation, row['channel'])] = (row['total'], row['done'])
+    return counts
+
+
+class LabelCountsLoader:
+    """
+    Loads the label counts of a batch of contents the first time any of them needs it.
+    """
+    def __init__(self, contents):
+        self.contents = contents
+        self.counts = None
+
+    def get(self, content):
+        if self.counts is None:
+            self.counts = load_label_counts(type(content), [c.pk for c in self.contents])
+        return self.counts.get(content.pk, {})
+
+
+class ContentIterable(ModelIterable):
+    """
+    Shares a label counts loader between the fetched contents, so listing them with their labels
+    (eg: the snippet listing and chooser) costs a constant number of queries instead of several per row.
+    """
+    chunk_size = 100
+
+    def __iter__(self):
+        iterator = super().__iter__()
+        while True:
+            contents = list(islice(iterator, self.chunk_size))
+            if not contents:
+                return
+            loader = LabelCountsLoader(contents)
+            for content in contents:
+                content._label_counts_loader = loader
+                yield content
+
+
+class ContentQuerySet(models.QuerySet):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._iterable_class = ContentIterable
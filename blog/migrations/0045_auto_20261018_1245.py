@@ -0,0 +1,33 @@
+# Generated by Django 2.2.12 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0043_cefechcontentnotification_cefechcontentsharing'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='content',
+            index=models.Index(fields=['publish_at', 'id'], name='content_publish_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ccee',
+            index=models.Index(fields=['title', 'id'], name='ccee_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ong',
+            index=models.Index(fields=['title', 'id'], name='ong_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transparency',
+            index=models.Index(fields=['publish_at', 'id'], name='transparency_publish_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archive',
+            index=models.Index(fields=['publish_at', 'id'], name='archive_publish_at_id_idx'),
+        ),
+    ]
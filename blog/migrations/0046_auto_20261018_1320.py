@@ -0,0 +1,53 @@
+# Generated by Django 2.2.12 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0045_auto_20261018_1245'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ccee',
+            name='ccee_title_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='ong',
+            name='ong_title_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transparency',
+            name='transparency_publish_at_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='archive',
+            name='archive_publish_at_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='content',
+            index=models.Index(fields=['publish_at', 'unpublish_at'], name='content_publish_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='content',
+            index=models.Index(condition=models.Q(unpublish_at__isnull=False), fields=['unpublish_at'], name='content_unpublish_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ccee',
+            index=models.Index(fields=['published', 'title', 'id'], name='ccee_published_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ong',
+            index=models.Index(fields=['published', 'title', 'id'], name='ong_published_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transparency',
+            index=models.Index(fields=['published', '-publish_at', '-id'], name='transparency_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archive',
+            index=models.Index(fields=['published', '-publish_at', '-id'], name='archive_published_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.12 on 2026-10-18 14:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_pending_jobs(apps, schema_editor):
+    """
+    Schedules the notifications and sharings that were not sent yet.
+    """
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Job = apps.get_model('blog', 'Job')
+    schedules = [
+        ('EventNotification', 'notify_at', 'notified'),
+        ('NewNotification', 'notify_at', 'notified'),
+        ('BenefitNotification', 'notify_at', 'notified'),
+        ('EventSharing', 'publish_at', 'published'),
+        ('NewSharing', 'publish_at', 'published'),
+        ('BenefitSharing', 'publish_at', 'published'),
+    ]
+    for model_name, run_at_field, done_field in schedules:
+        model = apps.get_model('blog', model_name)
+        content_type = ContentType.objects.get_for_model(model)
+        Job.objects.bulk_create([
+            Job(content_type=content_type, object_id=pk, run_at=run_at)
+            for pk, run_at in model.objects.filter(**{done_field: False}).values_list('pk', run_at_field)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('blog', '0046_auto_20261018_1320'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('object_id', models.PositiveIntegerField()),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Ejecutar el')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('RUNNING', 'En ejecución'), ('DONE', 'Terminado'), ('FAILED', 'Fallido')], default='PENDING', max_length=16, verbose_name='Estado')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Tomado el')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+            options={
+                'unique_together': {('content_type', 'object_id')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ),
+        migrations.RunPython(create_pending_jobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_cefech_sharing_jobs(apps, schema_editor):
+    """
+    Schedules the CEFECH sharings that were not published yet.
+    """
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Job = apps.get_model('blog', 'Job')
+    model = apps.get_model('blog', 'CEFECHContentSharing')
+    content_type = ContentType.objects.get_for_model(model)
+    Job.objects.bulk_create([
+        Job(content_type=content_type, object_id=pk, run_at=run_at)
+        for pk, run_at in model.objects.filter(published=False).values_list('pk', 'publish_at')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0047_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cefech_sharing_jobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.12 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+def mark_delivered(apps, schema_editor):
+    """
+    Notifications and sharings already sent are done.
+    """
+    apps.get_model('blog', 'Notification').objects.filter(notified=True).update(status='DONE')
+    apps.get_model('blog', 'Sharing').objects.filter(published=True).update(status='DONE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0048_cefech_sharing_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Tomado el'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pendiente'), ('CLAIMED', 'Tomado'), ('POSTING', 'Enviando'), ('DONE', 'Enviado'), ('FAILED', 'Fallido')], default='PENDING', max_length=16, verbose_name='Estado de envío'),
+        ),
+        migrations.AddField(
+            model_name='sharing',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Tomado el'),
+        ),
+        migrations.AddField(
+            model_name='sharing',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pendiente'), ('CLAIMED', 'Tomado'), ('POSTING', 'Enviando'), ('DONE', 'Enviado'), ('FAILED', 'Fallido')], default='PENDING', max_length=16, verbose_name='Estado de envío'),
+        ),
+        migrations.RunPython(mark_delivered, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.12 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0049_delivery_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sharing',
+            name='failures',
+            field=models.PositiveIntegerField(default=0, verbose_name='Intentos fallidos'),
+        ),
+        migrations.AddField(
+            model_name='sharing',
+            name='published_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Publicado el'),
+        ),
+    ]
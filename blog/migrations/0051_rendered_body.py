@@ -0,0 +1,54 @@
+# Generated by Django 2.2.12 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+def render_bodies(apps, schema_editor):
+    """
+    Stores the rendered body of the existing objects.
+    """
+    from wagtail.core.rich_text import RichText
+
+    for model_name in ['Content', 'CCEE', 'ONG', 'Transparency', 'Archive']:
+        model = apps.get_model('blog', model_name)
+        objects = []
+        for obj in model.objects.only('pk', 'body').iterator(chunk_size=500):
+            obj.rendered_body = RichText(obj.body).__html__()
+            objects.append(obj)
+        model.objects.bulk_update(objects, ['rendered_body'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0050_sharing_published_at_failures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archive',
+            name='rendered_body',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ccee',
+            name='rendered_body',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='content',
+            name='rendered_body',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ong',
+            name='rendered_body',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='transparency',
+            name='rendered_body',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(render_bodies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 2.2.12 on 2026-10-18 19:20
+
+from collections import defaultdict
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value, TextField
+
+
+def get_search_vector(texts):
+    config = getattr(settings, 'SEARCH_CONFIG', 'spanish')
+    vectors = [SearchVector(Value(text or '', output_field=TextField()), weight=weight, config=config)
+               for text, weight in texts]
+    vector = vectors[0]
+    for other in vectors[1:]:
+        vector = vector + other
+    return vector
+
+
+def build_search_documents(apps, schema_editor):
+    """
+    Builds the search documents of the existing contents, as SearchDocumentMixin does on save.
+    """
+    tags = defaultdict(list)
+    for content_id, name in apps.get_model('blog', 'ContentTags').objects.values_list('content_object_id', 'tag__name'):
+        tags[content_id].append(name)
+    places = dict(apps.get_model('blog', 'Event').objects.values_list('pk', 'place__name'))
+
+    Content = apps.get_model('blog', 'Content')
+    for pk, title, body in Content.objects.values_list('pk', 'title', 'body').iterator():
+        texts = [(title, 'A'), (body, 'B'), (' '.join(tags[pk]), 'A')]
+        if pk in places:
+            texts.append((places[pk], 'C'))
+        Content.objects.filter(pk=pk).update(search_document=get_search_vector(texts))
+
+    for model_name in ['CCEE', 'ONG', 'Transparency', 'Archive']:
+        model = apps.get_model('blog', model_name)
+        for pk, title, body, address in model.objects.values_list('pk', 'title', 'body', 'address').iterator():
+            model.objects.filter(pk=pk).update(
+                search_document=get_search_vector([(title, 'A'), (body, 'B'), (address, 'C')]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0051_rendered_body'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archive',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ccee',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='content',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ong',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='transparency',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='archive',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='archive_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ccee',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='ccee_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='content',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='content_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ong',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='ong_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transparency',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='transparency_search_idx'),
+        ),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
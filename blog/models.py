@@ -4,11 +4,11 @@ import pytz
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.db.models import DecimalField
 from django.utils.html import format_html
-from fcm_django.api.rest_framework import FCMDeviceAuthorizedViewSet
-from fcm_django.models import FCMDevice
 from modelcluster.contrib.taggit import ClusterTaggableManager
 from modelcluster.fields import ParentalKey
 from modelcluster.models import ClusterableModel
@@ -29,7 +29,10 @@ from babel.dates import format_datetime, format_date
 from django.utils.timezone import now
 from django.utils.translation import ugettext_lazy as _
 
-from blog.serializers import UserSerializer, RichTextRendereableField, get_place_serializer
+from blog.managers import ContentQuerySet, LabelCountsLoader
+from blog.search import get_search_vector
+from notifications.models import DeliveryMixin
+from blog.serializers import UserSerializer, RenderedRichTextField, PrefetchedTagsField, get_place_serializer
 
 
 class ReadOnlyPanel(EditHandler):
@@ -236,6 +239,57 @@ class CreateMixin(models.Model):
         abstract = True
 
 
+class RenderedBodyMixin(models.Model):
+    """
+    Provides a mixin for storing the HTML of the rich text body, rendered when the object is saved.
+    Rendering resolves the links and embeds of the body with DB lookups, so it's done once instead of
+    on every API request.
+    """
+    rendered_body = models.TextField(null=True, blank=True, editable=False)
+    """
+    HTML of the body, null until the object is saved.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.rendered_body = RichText(self.body).__html__()
+        return super().save(*args, **kwargs)
+
+    @property
+    def body_as_html(self):
+        if self.rendered_body is None:
+            return RichText(self.body).__html__()
+        return self.rendered_body
+
+
+class SearchDocumentMixin(models.Model):
+    """
+    Provides a mixin for maintaining the full text search document (PostgreSQL tsvector) of the object,
+    updated when it's saved and searched through a GIN index.
+    """
+    search_document = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def get_search_texts(self):
+        """
+        Weighted (text, weight) pairs of the search document.
+        """
+        return [(self.title, 'A'), (self.body, 'B')]
+
+    def update_search_document(self):
+        model = self._meta.get_field('search_document').model
+        model.objects.filter(pk=self.pk).update(search_document=get_search_vector(self.get_search_texts()))
+
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        self.update_search_document()
+        return result
+
+
 class ContentTags(TaggedItemBase):
     content_object = ParentalKey(
         'Content',
@@ -244,7 +298,7 @@ class ContentTags(TaggedItemBase):
     )
 
 
-class Content(CreateMixin, ClusterableModel):
+class Content(CreateMixin, RenderedBodyMixin, SearchDocumentMixin, ClusterableModel):
     author = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True)
     image = models.ForeignKey(
         'wagtailimages.Image', on_delete=models.DO_NOTHING, related_name='+', verbose_name="Imagen"
@@ -256,6 +310,16 @@ class Content(CreateMixin, ClusterableModel):
     unpublish_at = models.DateTimeField('Despublicar el', null=True, blank=True)
     pinned = models.BooleanField('Destacar', default=False, help_text='Destacar el contenido para que aparezca al comienzo.')
 
+    objects = ContentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['publish_at', 'id'], name='content_publish_at_id_idx'),
+            models.Index(fields=['publish_at', 'unpublish_at'], name='content_publish_window_idx'),
+            models.Index(fields=['unpublish_at'], name='content_unpublish_at_idx',
+                         condition=models.Q(unpublish_at__isnull=False)),
+            GinIndex(fields=['search_document'], name='content_search_idx'),
+        ]
 
     search_fields = [
         index.SearchField('body'),
@@ -283,10 +347,10 @@ class Content(CreateMixin, ClusterableModel):
 
     api_fields = [
         APIField('title'),
-        APIField('body', serializer=RichTextRendereableField()),
+        APIField('body', serializer=RenderedRichTextField()),
         APIField('image'),
         APIField('author', serializer=UserSerializer()),
-        APIField('tags'),
+        APIField('tags', serializer=PrefetchedTagsField()),
         APIField('publish_at'),
         APIField('pinned'),
     ]
@@ -295,10 +359,8 @@ class Content(CreateMixin, ClusterableModel):
     def image_path(self):
         return self.image.file.path
 
-    @property
-    def body_as_html(self):
-        rich_text = RichText(self.body)
-        return rich_text.__html__()
+    def get_search_texts(self):
+        return super().get_search_texts() + [(' '.join(self.tags.names()), 'A')]
 
     def __str__(self):
         date = format_datetime(self.created_at.astimezone(pytz.timezone("America/Santiago")), 'dd/MMM/YYYY', locale='es')
@@ -336,28 +398,37 @@ class Content(CreateMixin, ClusterableModel):
         label = '%s%s' % ('📌 ' if self.is_pinned() else '', label)
         return label + self.get_notification_labels() + self.get_sharing_labels()
 
+    def get_label_counts(self):
+        """
+        Notification and sharing counts per channel. Contents fetched together share the same loader, so
+        the counts of a whole listing are loaded at once.
+        """
+        loader = getattr(self, '_label_counts_loader', None)
+        if loader is None:
+            loader = LabelCountsLoader([self])
+            self._label_counts_loader = loader
+        return loader.get(self)
+
     def get_notification_labels(self):
         label = ''
-        mobile_notifications = self.notifications.filter(channel='MOBILE')
-        email_notifications = self.notifications.filter(channel='EMAIL')
-        if mobile_notifications.count():
-            count = mobile_notifications.filter(notified=True).count()
-            label = label + ' 🔔%d' % count
-        if email_notifications.count():
-            count = email_notifications.filter(notified=True).count()
-            label = label + ' @%d' % count
+        counts = self.get_label_counts()
+        mobile_notifications = counts.get(('notifications', 'MOBILE'))
+        email_notifications = counts.get(('notifications', 'EMAIL'))
+        if mobile_notifications:
+            label = label + ' 🔔%d' % mobile_notifications[1]
+        if email_notifications:
+            label = label + ' @%d' % email_notifications[1]
         return label
 
     def get_sharing_labels(self):
         label = ''
-        twitter_notifications = self.sharings.filter(channel='TWITTER')
-        ig_notifications = self.sharings.filter(channel='INSTAGRAM')
-        if twitter_notifications.count():
-            count = twitter_notifications.filter(published=True).count()
-            label = label + ' 🕊%d' % count
-        if ig_notifications.count():
-            count = ig_notifications.filter(published=True).count()
-            label = label + ' ⧇%d' % count
+        counts = self.get_label_counts()
+        twitter_notifications = counts.get(('sharings', 'TWITTER'))
+        ig_notifications = counts.get(('sharings', 'INSTAGRAM'))
+        if twitter_notifications:
+            label = label + ' 🕊%d' % twitter_notifications[1]
+        if ig_notifications:
+            label = label + ' ⧇%d' % ig_notifications[1]
         return label
 
 
@@ -394,6 +465,9 @@ class Event(Content):
         APIField('place', serializer=get_place_serializer()),
     ]
 
+    def get_search_texts(self):
+        return super().get_search_texts() + [(self.place.name if self.place else '', 'C')]
+
     # edit_handler = TabbedInterface([
     #     ObjectList(panels, heading="Contenido"),
     #     ObjectList([
@@ -468,7 +542,7 @@ class Benefit(Content):
         return '%s. %s - %s' % (date, self.title, self.get_published_label())
 
 
-class Notification(CreateMixin):
+class Notification(DeliveryMixin, CreateMixin):
 
     CHANNEL_EMAIL = 'EMAIL'
     CHANNEL_MOBILE = 'MOBILE'
@@ -510,13 +584,15 @@ class Notification(CreateMixin):
     ]
 
 
-class Sharing(CreateMixin):
+class Sharing(DeliveryMixin, CreateMixin):
 
     SOCIAL_FACEBOOK = 'FACEBOOK'
     SOCIAL_INSTAGRAM = 'INSTAGRAM'
     SOCIAL_TWITTER = 'TWITTER'
     publish_at = models.DateTimeField("Fecha de publicación", default=now)
     published = models.BooleanField("Se ha publicado", default=False)
+    published_at = models.DateTimeField("Publicado el", null=True, blank=True)
+    failures = models.PositiveIntegerField("Intentos fallidos", default=0)
     description = models.TextField("Descripción", max_length=2048, help_text='Número máximo de carácteres depende de la red social utilizada (IG: 2200, Twitter: 280).', null=True)
     channel = models.CharField('Red social', max_length=32, choices=[
         # (SOCIAL_FACEBOOK, 'Facebook'),
@@ -533,6 +609,8 @@ class Sharing(CreateMixin):
             FieldPanel('channel', classname="col6"),
             FieldPanel('description', classname="col12"),
             ReadOnlyPanel('published', classname="col12", heading='¿Publicado?'),
+            ReadOnlyPanel('status', classname="col6", heading='Estado'),
+            ReadOnlyPanel('published_at', classname="col6", heading='Publicado el'),
         ], heading="Publicar el",
             classname="collapsible collapsed")
     ]
@@ -544,6 +622,20 @@ class Sharing(CreateMixin):
         APIField('channel'),
     ]
 
+    @classmethod
+    def get_models(cls):
+        """
+        Sharing models of each kind of content.
+        """
+        return [model for model in cls.__subclasses__() if not model._meta.abstract]
+
+    @classmethod
+    def get_object_field(cls):
+        """
+        Name of the field of the shared content.
+        """
+        return next(field.name for field in cls._meta.local_fields if isinstance(field, ParentalKey))
+
 
 class EventNotification(Notification, Orderable):
     event = ParentalKey(to='blog.Event', on_delete=models.CASCADE, related_name='notifications')
@@ -589,7 +681,7 @@ class NewSharing(Sharing, Orderable):
 register_snippet(User)
 
 
-class RawContent(CreateMixin, ClusterableModel):
+class RawContent(CreateMixin, RenderedBodyMixin, SearchDocumentMixin, ClusterableModel):
     image = models.ForeignKey(
         'wagtailimages.Image', on_delete=models.DO_NOTHING, related_name='+', verbose_name="Imagen"
     )
@@ -616,7 +708,7 @@ class RawContent(CreateMixin, ClusterableModel):
 
     api_fields = [
         APIField('title'),
-        APIField('body', serializer=RichTextRendereableField()),
+        APIField('body', serializer=RenderedRichTextField()),
         APIField('image'),
         APIField('address'),
         APIField('published'),
@@ -627,10 +719,8 @@ class RawContent(CreateMixin, ClusterableModel):
     def image_path(self):
         return self.image.file.path
 
-    @property
-    def body_as_html(self):
-        rich_text = RichText(self.body)
-        return rich_text.__html__()
+    def get_search_texts(self):
+        return super().get_search_texts() + [(self.address, 'C')]
 
     def __str__(self):
         return self.title
@@ -640,6 +730,10 @@ class CCEE(RawContent):
     class Meta:
         verbose_name = 'CCEE'
         verbose_name_plural = 'CCEEs'
+        indexes = [
+            models.Index(fields=['published', 'title', 'id'], name='ccee_published_title_idx'),
+            GinIndex(fields=['search_document'], name='ccee_search_idx'),
+        ]
 
 
 register_snippet(CCEE)
@@ -649,6 +743,10 @@ class ONG(RawContent):
     class Meta:
         verbose_name = 'ONG'
         verbose_name_plural = 'ONGs'
+        indexes = [
+            models.Index(fields=['published', 'title', 'id'], name='ong_published_title_idx'),
+            GinIndex(fields=['search_document'], name='ong_search_idx'),
+        ]
 
 
 register_snippet(ONG)
@@ -678,7 +776,7 @@ class FileContent(RawContent):
 
     api_fields = [
         APIField('title'),
-        APIField('body', serializer=RichTextRendereableField()),
+        APIField('body', serializer=RenderedRichTextField()),
         APIField('image'),
         APIField('file'),
         APIField('published'),
@@ -696,6 +794,10 @@ class Transparency(FileContent):
     class Meta:
         verbose_name = 'Transparencia'
         verbose_name_plural = 'Transparencias'
+        indexes = [
+            models.Index(fields=['published', '-publish_at', '-id'], name='transparency_published_idx'),
+            GinIndex(fields=['search_document'], name='transparency_search_idx'),
+        ]
 
 
 register_snippet(Transparency)
@@ -717,7 +819,7 @@ class Archive(FileContent):
 
     api_fields = [
         APIField('title'),
-        APIField('body', serializer=RichTextRendereableField()),
+        APIField('body', serializer=RenderedRichTextField()),
         APIField('image'),
         APIField('file'),
         APIField('publish_at'),
@@ -729,6 +831,10 @@ class Archive(FileContent):
     class Meta:
         verbose_name = 'Archivo'
         verbose_name_plural = 'Archivos'
+        indexes = [
+            models.Index(fields=['published', '-publish_at', '-id'], name='archive_published_idx'),
+            GinIndex(fields=['search_document'], name='archive_search_idx'),
+        ]
 
 
 register_snippet(Archive)
@@ -758,4 +864,33 @@ class CEFECHContentSharing(Sharing, Orderable):
     event = ParentalKey(to='blog.CEFECHContent', on_delete=models.CASCADE, related_name='sharings')
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+
+class Job(CreateMixin):
+    """
+    Scheduled delivery of a notification or sharing. Workers claim due jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED, so several of them can run in parallel.
+    """
+    STATUS_PENDING = 'PENDING'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_DONE = 'DONE'
+    STATUS_FAILED = 'FAILED'
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    run_at = models.DateTimeField('Ejecutar el', default=now)
+    status = models.CharField('Estado', max_length=16, choices=[
+        (STATUS_PENDING, 'Pendiente'),
+        (STATUS_RUNNING, 'En ejecución'),
+        (STATUS_DONE, 'Terminado'),
+        (STATUS_FAILED, 'Fallido'),
+    ], default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField('Intentos', default=0)
+    claimed_at = models.DateTimeField('Tomado el', null=True, blank=True)
+
+    class Meta:
+        unique_together = ('content_type', 'object_id')
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
@@ -1,38 +1,57 @@
 from blog.models import EventNotification, NewNotification, BenefitNotification
-from notifications.notifiers import BaseNotificationProvider, EmailNotificationSender, PushNotificationSender
+from notifications.notifiers import BaseNotificationProvider, EmailNotificationSender, PushNotificationSender, \
+    EmailRecipients
 from django.contrib.auth.models import User
 
 
-def send_notifications():
-    send_email_notifications()
-    send_push_notifications()
-
-
-def send_email_notifications():
-    users = User.objects.all()
-    provider = BaseNotificationProvider(EventNotification.objects)
-    sender = EmailNotificationSender(provider, 'event', title='BenefiCh - ¡Se ha añadido un evento!')
-    sender.send_notifications(users)
-
-    provider = BaseNotificationProvider(NewNotification.objects)
-    sender = EmailNotificationSender(provider, 'new', title='BenefiCh - ¡Se ha añadido una noticia!')
-    sender.send_notifications(users)
-
-    provider = BaseNotificationProvider(BenefitNotification.objects)
-    sender = EmailNotificationSender(provider, 'benefit', title='BenefiCh - ¡Hay un nuevo beneficio para ti!')
-    sender.send_notifications(users)
-
-
-def send_push_notifications():
-    users = User.objects.all()
-    provider = BaseNotificationProvider(EventNotification.objects)
-    sender = PushNotificationSender(provider, 'event', title='¡Se ha añadido un evento!', topic='eventsAt{{place_id}}')
-    sender.send_notifications(users)
-
-    provider = BaseNotificationProvider(NewNotification.objects)
-    sender = PushNotificationSender(provider, 'new', title='¡Se ha añadido una noticia!', topic='news')
-    sender.send_notifications(users)
-
-    provider = BaseNotificationProvider(BenefitNotification.objects)
-    sender = PushNotificationSender(provider, 'benefit', title='¡Hay un nuevo beneficio para ti!', topic='benefits')
-    sender.send_notifications(users)
\ No newline at end of file
+"""
+Email notifications: (model, object field, title)
+"""
+EMAIL_NOTIFICATIONS = [
+    (EventNotification, 'event', 'BenefiCh - ¡Se ha añadido un evento!'),
+    (NewNotification, 'new', 'BenefiCh - ¡Se ha añadido una noticia!'),
+    (BenefitNotification, 'benefit', 'BenefiCh - ¡Hay un nuevo beneficio para ti!'),
+]
+
+"""
+Push notifications: (model, object field, title, topic)
+"""
+PUSH_NOTIFICATIONS = [
+    (EventNotification, 'event', '¡Se ha añadido un evento!', 'eventsAt{{place_id}}'),
+    (NewNotification, 'new', '¡Se ha añadido una noticia!', 'news'),
+    (BenefitNotification, 'benefit', '¡Hay un nuevo beneficio para ti!', 'benefits'),
+]
+
+
+def get_notifications(model, ids=None):
+    """
+    Notifications of the model, restricted to the given ids ({model: [pk, ...]}) if any.
+    """
+    if ids is None:
+        return model.objects
+    return model.objects.filter(pk__in=ids.get(model, []))
+
+
+def send_notifications(ids=None):
+    send_email_notifications(ids)
+    send_push_notifications(ids)
+
+
+def send_email_notifications(ids=None):
+    users = EmailRecipients(User.objects.all())
+    for model, object_field, title in EMAIL_NOTIFICATIONS:
+        if ids is not None and model not in ids:
+            continue
+        provider = BaseNotificationProvider(get_notifications(model, ids))
+        sender = EmailNotificationSender(provider, object_field, title=title)
+        sender.send_notifications(users)
+
+
+def send_push_notifications(ids=None):
+    for model, object_field, title, topic in PUSH_NOTIFICATIONS:
+        if ids is not None and model not in ids:
+            continue
+        provider = BaseNotificationProvider(get_notifications(model, ids))
+        sender = PushNotificationSender(provider, object_field, title=title, topic=topic)
+        # Push notifications are sent to topics, not to users
+        sender.send_notifications(None)
@@ -1,40 +1,62 @@
-from django.db.models import F
+from concurrent.futures import ThreadPoolExecutor
 
-from blog.models import EventSharing, NewSharing, BenefitSharing
-from social.publishers import BasePublicationProvider, TwitterPublisher, InstagramPublisher
+from django.db import connection
+
+from blog.models import Sharing
+from social.publishers import BasePublicationProvider, TwitterPublisher, InstagramPublisher, ChannelRunner
 
 """
-Create publications for specified social networks.
+Publishers of each social network
 """
-def create_publications():
-    create_twitter_publications()
-    create_instagram_publications()
+PUBLISHERS = [TwitterPublisher, InstagramPublisher]
+
+
+def get_sharings(model, ids=None):
+    """
+    Sharings of the model, restricted to the given ids ({model: [pk, ...]}) if any.
+    """
+    if ids is None:
+        return model.objects
+    return model.objects.filter(pk__in=ids.get(model, []))
 
 
-def create_twitter_publications():
-    provider = BasePublicationProvider(EventSharing.objects)
-    sender = TwitterPublisher(provider, 'event')
-    sender.post_publications()
+def get_channel_runner(publisher_class, ids=None):
+    """
+    Runner of the publisher through the sharings of every content model.
+    """
+    publishers = [publisher_class(BasePublicationProvider(get_sharings(model, ids)), model.get_object_field())
+                  for model in Sharing.get_models() if ids is None or model in ids]
+    return ChannelRunner(publishers) if publishers else None
 
-    provider = BasePublicationProvider(NewSharing.objects)
-    sender = TwitterPublisher(provider, 'new')
-    sender.post_publications()
 
-    provider = BasePublicationProvider(BenefitSharing.objects)
-    sender = TwitterPublisher(provider, 'benefit')
-    sender.post_publications()
+def run_channel(runner):
+    try:
+        runner.run()
+    finally:
+        # Each channel runs in its own thread and database connection
+        connection.close()
 
 
-def create_instagram_publications():
-    provider = BasePublicationProvider(EventSharing.objects)
+"""
+Create publications for specified social networks. Each network runs in its own thread, so a slow
+one doesn't delay the others.
+"""
+def create_publications(ids=None):
+    runners = [runner for runner in (get_channel_runner(publisher, ids) for publisher in PUBLISHERS) if runner]
+    if not runners:
+        return
+    with ThreadPoolExecutor(max_workers=len(runners)) as executor:
+        for result in executor.map(run_channel, runners):
+            pass
+
 
-    sender = InstagramPublisher(provider, 'event')
-    sender.post_publications()
+def create_twitter_publications(ids=None):
+    runner = get_channel_runner(TwitterPublisher, ids)
+    if runner:
+        runner.run()
 
-    provider = BasePublicationProvider(NewSharing.objects)
-    sender = InstagramPublisher(provider, 'new')
-    sender.post_publications()
 
-    provider = BasePublicationProvider(BenefitSharing.objects)
-    sender = InstagramPublisher(provider, 'benefit')
-    sender.post_publications()
\ No newline at end of file
+def create_instagram_publications(ids=None):
+    runner = get_channel_runner(InstagramPublisher, ids)
+    if runner:
+        runner.run()
@@ -0,0 +1,109 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import F, Value, TextField
+from django.db.models.signals import post_save, post_delete
+
+"""
+PostgreSQL text search configuration of the contents
+"""
+SEARCH_CONFIG = getattr(settings, 'SEARCH_CONFIG', 'spanish')
+
+SEARCH_OPERATOR_AND = 'and'
+SEARCH_OPERATOR_OR = 'or'
+
+
+def get_search_vector(texts):
+    """
+    Search document of (text, weight) pairs. Weights go from A (most relevant) to D.
+    """
+    vectors = [SearchVector(Value(text or '', output_field=TextField()), weight=weight, config=SEARCH_CONFIG)
+               for text, weight in texts]
+    vector = vectors[0]
+    for other in vectors[1:]:
+        vector = vector + other
+    return vector
+
+
+def get_search_query(text, operator=SEARCH_OPERATOR_AND):
+    if operator == SEARCH_OPERATOR_OR:
+        query = None
+        for word in text.split():
+            word_query = SearchQuery(word, config=SEARCH_CONFIG)
+            query = word_query if query is None else query | word_query
+        return query
+    return SearchQuery(text, config=SEARCH_CONFIG)
+
+
+def search(queryset, text, operator=SEARCH_OPERATOR_AND):
+    """
+    Filters the objects whose search document matches the text, most relevant first.
+    """
+    query = get_search_query(text, operator)
+    if query is None:
+        return queryset.none()
+    return queryset.filter(search_document=query)\
+        .annotate(search_rank=SearchRank(F('search_document'), query))\
+        .order_by('-search_rank', *queryset.query.order_by)
+
+
+def get_specific_content(pk):
+    """
+    Content of the given pk as its subclass, found with a single query joining the subclass tables.
+    """
+    from blog.models import Content
+
+    names = [model._meta.model_name for model in Content.__subclasses__()]
+    content = Content.objects.select_related(*names).filter(pk=pk).first()
+    if content is None:
+        return None
+    for name in names:
+        try:
+            return getattr(content, name)
+        except ObjectDoesNotExist:
+            pass
+    return content
+
+
+def update_pending_document(pending, pk):
+    # Only the first callback of the content in the transaction updates it
+    if pk in pending:
+        pending.discard(pk)
+        content = get_specific_content(pk)
+        if content is not None:
+            content.update_search_document()
+
+
+def update_tagged_document(sender, instance, **kwargs):
+    """
+    Updates the search document of the tagged content once the transaction commits, so saving
+    all the tags of a content rebuilds its document once instead of once per tag.
+    """
+    connection = transaction.get_connection()
+    # Contents whose document must be updated, kept on the connection as each one has its own transactions
+    pending = getattr(connection, 'pending_search_documents', None)
+    if pending is None:
+        pending = connection.pending_search_documents = set()
+    pending.add(instance.content_object_id)
+    transaction.on_commit(partial(update_pending_document, pending, instance.content_object_id))
+
+
+def update_place_documents(sender, instance, **kwargs):
+    from blog.models import Event
+
+    for event in Event.objects.filter(place=instance):
+        event.update_search_document()
+
+
+def connect_signals():
+    """
+    Updates the search documents when their tags or places change.
+    """
+    from blog.models import ContentTags, Place
+
+    post_save.connect(update_tagged_document, sender=ContentTags, dispatch_uid='blog_search_tags_save')
+    post_delete.connect(update_tagged_document, sender=ContentTags, dispatch_uid='blog_search_tags_delete')
+    post_save.connect(update_place_documents, sender=Place, dispatch_uid='blog_search_place_save')
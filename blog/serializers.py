@@ -39,3 +39,29 @@ class RichTextRendereableField(serializers.CharField):
 
 
 
+
+
+class RenderedRichTextField(RichTextRendereableField):
+    """
+    Reads the HTML stored when the object was saved (see blog.models.RenderedBodyMixin), so serializing
+    doesn't render the rich text. Objects not saved since it's stored are rendered as before.
+    """
+    def __init__(self, rendered_field='rendered_body', **kwargs):
+        kwargs.setdefault('source', '*')
+        super().__init__(**kwargs)
+        self.rendered_field = rendered_field
+
+    def to_representation(self, instance):
+        rendered = getattr(instance, self.rendered_field)
+        if rendered is None:
+            return super().to_representation(getattr(instance, self.field_name))
+        return rendered
+
+
+class PrefetchedTagsField(serializers.Field):
+    """
+    Tag names of the object, sorted. Unlike Wagtail's TagsField it reads tags.all(), so tags prefetched
+    with the listing are used instead of querying each object's tags.
+    """
+    def to_representation(self, value):
+        return sorted(tag.name for tag in value.all())
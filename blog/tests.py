@@ -1,3 +1,364 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from wagtail.documents.models import Document
+from wagtail.images.models import Image
+
+from blog.jobs import claim_jobs, run_jobs, JOB_MAX_ATTEMPTS
+from blog.models import CEFECHContent, CCEE, Archive, Event, Place, EventNotification, EventSharing, Job
+from blog.search import search, SEARCH_OPERATOR_OR
+from fech.api import CEFECHSnippetAPIEndpoint, ArchiveSnippetAPIEndpoint
+from notifications.models import DeliveryMixin
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are only checked on PostgreSQL')
+class PublishWindowIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        image = Image.objects.create(title='image', file='original_images/index.png', width=1, height=1)
+        document = Document.objects.create(title='document', file='documents/Recomendacion.pdf')
+        dt_now = now()
+        for i in range(200):
+            publish_at = dt_now + timedelta(days=i - 100)
+            unpublish_at = publish_at + timedelta(days=30) if i % 3 == 0 else None
+            CEFECHContent.objects.create(title='cefech %d' % i, image=image, publish_at=publish_at,
+                                         unpublish_at=unpublish_at)
+            Archive.objects.create(title='archive %d' % i, image=image, publish_at=publish_at, published=i % 2 == 0,
+                                   file=document)
+
+    def explain(self, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        try:
+            return queryset.explain()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = on')
+
+    def test_cefech_listing_uses_publish_index(self):
+        plan = self.explain(CEFECHSnippetAPIEndpoint().get_queryset()[:20])
+        self.assertIn('content_publish_window_idx', plan)
+
+    def test_archive_listing_uses_published_index(self):
+        plan = self.explain(ArchiveSnippetAPIEndpoint().get_queryset()[:20])
+        self.assertIn('archive_published_idx', plan)
+
+
+@override_settings(WAGTAILAPI_LIMIT_MAX=50)
+class EventListingQueriesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', first_name='Author')
+        place = Place.objects.create(name='place', address='address', lat=0, lng=0)
+        dt_now = now()
+        for i in range(50):
+            image = Image.objects.create(title='image %d' % i, file='original_images/index.png', width=1, height=1)
+            event = Event.objects.create(title='event %d' % i, image=image, author=author, place=place,
+                                         start=dt_now, publish_at=dt_now - timedelta(days=1))
+            event.tags.add('tag %d' % i, 'common')
+
+    def setUp(self):
+        # Each request must reach the database, not the cached response of another test
+        caches[settings.SNIPPET_API_CACHE].clear()
+
+    def count_queries(self, limit):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v2/events/', {'limit': limit, 'fields': '*'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['items']), limit)
+        return len(queries)
+
+    def test_listing_queries_dont_depend_on_page_size(self):
+        self.assertEqual(self.count_queries(5), self.count_queries(50))
+
+    def test_listing_queries(self):
+        # Count, page and tags
+        self.assertLessEqual(self.count_queries(50), 8)
+
+
+class LabelQueriesTest(TestCase):
+
+    def setUp(self):
+        self.image = Image.objects.create(title='image', file='original_images/index.png', width=1, height=1)
+
+    def create_events(self, count):
+        for i in range(count):
+            event = Event.objects.create(title='event %d' % i, image=self.image, start=now())
+            EventNotification.objects.create(event=event, channel=EventNotification.CHANNEL_MOBILE, notified=True)
+            EventNotification.objects.create(event=event, channel=EventNotification.CHANNEL_EMAIL)
+            EventSharing.objects.create(event=event, channel=EventSharing.SOCIAL_TWITTER, published=True)
+
+    def get_labels(self):
+        return [event.get_published_label() for event in Event.objects.all()]
+
+    def test_label_queries_dont_depend_on_listing_size(self):
+        # Contents, notification counts and sharing counts
+        self.create_events(2)
+        with self.assertNumQueries(3):
+            labels = self.get_labels()
+        self.assertEqual(len(labels), 2)
+        self.assertTrue(labels[0].endswith(' 🔔1 @0 🕊1'))
+        self.create_events(18)
+        with self.assertNumQueries(3):
+            self.assertEqual(len(self.get_labels()), 20)
+
+    def test_admin_listing_queries_dont_depend_on_listing_size(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/admin/snippets/blog/event/')
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self.create_events(2)
+        small = count_queries()
+        self.create_events(18)
+        self.assertEqual(count_queries(), small)
+
+
+class TagFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        image = Image.objects.create(title='image', file='original_images/index.png', width=1, height=1)
+        yesterday = now() - timedelta(days=1)
+        for title, tags in [('a', ['red']), ('b', ['red', 'blue']), ('c', ['blue']), ('d', [])]:
+            event = Event.objects.create(title=title, image=image, start=now(), publish_at=yesterday)
+            event.tags.add(*tags)
+
+    def get_titles(self, params):
+        response = self.client.get('/api/v2/events/', dict(params, fields='title'))
+        self.assertEqual(response.status_code, 200)
+        return sorted(item['title'] for item in response.json()['items'])
+
+    def test_all_tags(self):
+        self.assertEqual(self.get_titles({'tags': 'red,blue'}), ['b'])
+
+    def test_any_tag(self):
+        self.assertEqual(self.get_titles({'tags': 'red,blue', 'tag_match': 'any'}), ['a', 'b', 'c'])
+
+    def test_invalid_tag_match(self):
+        response = self.client.get('/api/v2/events/', {'tags': 'red', 'tag_match': 'some'})
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Full text search is only supported on PostgreSQL')
+class SearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        image = Image.objects.create(title='image', file='original_images/index.png', width=1, height=1)
+        yesterday = now() - timedelta(days=1)
+        for title, body in [('Feria de deportes', '<p>Becas para deportistas</p>'),
+                            ('Becas de alimentación', '<p>Postulaciones abiertas</p>'),
+                            ('Becas y deportes', ''),
+                            ('Concierto', '<p>Música en vivo</p>')]:
+            Event.objects.create(title=title, body=body, image=image, start=now(), publish_at=yesterday)
+
+    def setUp(self):
+        caches[settings.SNIPPET_API_CACHE].clear()
+
+    def get_titles(self, params):
+        response = self.client.get('/api/v2/events/', dict(params, fields='title'))
+        self.assertEqual(response.status_code, 200)
+        return [item['title'] for item in response.json()['items']]
+
+    def test_title_matches_rank_first(self):
+        titles = self.get_titles({'search': 'becas'})
+        self.assertEqual(sorted(titles[:2]), ['Becas de alimentación', 'Becas y deportes'])
+        self.assertEqual(titles[2:], ['Feria de deportes'])
+
+    def test_all_words(self):
+        self.assertEqual(sorted(self.get_titles({'search': 'becas deportes'})),
+                         ['Becas y deportes', 'Feria de deportes'])
+
+    def test_any_word(self):
+        titles = self.get_titles({'search': 'alimentación concierto', 'search_operator': SEARCH_OPERATOR_OR})
+        self.assertEqual(sorted(titles), ['Becas de alimentación', 'Concierto'])
+
+    def test_invalid_operator(self):
+        response = self.client.get('/api/v2/events/', {'search': 'becas', 'search_operator': 'xor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_with_cursor(self):
+        response = self.client.get('/api/v2/events/', {'search': 'becas', 'cursor': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Full text search is only supported on PostgreSQL')
+class SearchDocumentUpdateTest(TransactionTestCase):
+    """
+    Tag documents are updated on commit, so these tests need real transactions.
+    """
+
+    def setUp(self):
+        image = Image.objects.create(title='image', file='original_images/index.png', width=1, height=1)
+        self.place = Place.objects.create(name='Casa Central', address='Alameda 340', lat=0, lng=0)
+        self.event = Event.objects.create(title='Bienvenida', image=image, start=now(), place=self.place)
+
+    def get_matches(self, text):
+        return list(search(Event.objects.all(), text).values_list('pk', flat=True))
+
+    def test_place_document(self):
+        self.assertEqual(self.get_matches('central'), [self.event.pk])
+        self.place.name = 'Gimnasio'
+        self.place.save()
+        self.assertEqual(self.get_matches('central'), [])
+        self.assertEqual(self.get_matches('gimnasio'), [self.event.pk])
+
+    def test_tag_document(self):
+        self.event.tags.add('voluntariado')
+        self.assertEqual(self.get_matches('voluntariado'), [self.event.pk])
+        self.event.tags.remove('voluntariado')
+        self.assertEqual(self.get_matches('voluntariado'), [])
+
+    def test_tag_document_updated_once_per_transaction(self):
+        with CaptureQueriesContext(connection) as one_tag:
+            with transaction.atomic():
+                self.event.tags.add('uno')
+        with CaptureQueriesContext(connection) as many_tags:
+            with transaction.atomic():
+                for i in range(10):
+                    self.event.tags.add('tag %d' % i)
+        document_updates = [[query for query in queries
+                             if query['sql'].startswith('UPDATE') and 'search_document' in query['sql']]
+                            for queries in (one_tag, many_tags)]
+        self.assertEqual(len(document_updates[0]), 1)
+        self.assertEqual(len(document_updates[1]), 1)
+        self.assertEqual(self.get_matches('uno'), [self.event.pk])
+
+
+class JobQueueTest(TestCase):
+
+    def setUp(self):
+        image = Image.objects.create(title='image', file='original_images/index.png', width=1, height=1)
+        event = Event.objects.create(title='event', image=image, start=now())
+        self.notification = EventNotification.objects.create(event=event, notify_at=now() - timedelta(minutes=1))
+
+    def get_job(self):
+        return Job.objects.get(object_id=self.notification.pk)
+
+    def run_claimed(self, notify=False):
+        def send_notifications(ids):
+            if notify:
+                EventNotification.objects.filter(pk__in=ids[EventNotification]).update(notified=True)
+        with mock.patch('blog.notifications.send_notifications', side_effect=send_notifications):
+            return run_jobs(claim_jobs())
+
+    def exhaust(self):
+        Job.objects.update(attempts=JOB_MAX_ATTEMPTS - 1)
+        self.run_claimed()
+
+    def test_claim_jobs(self):
+        jobs = claim_jobs()
+        self.assertEqual([job.object_id for job in jobs], [self.notification.pk])
+        job = self.get_job()
+        self.assertEqual(job.status, Job.STATUS_RUNNING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(claim_jobs(), [])
+
+    def test_future_jobs_are_not_claimed(self):
+        self.notification.notify_at = now() + timedelta(hours=1)
+        self.notification.save()
+        self.assertEqual(claim_jobs(), [])
+
+    def test_delivered_job(self):
+        self.assertEqual(self.run_claimed(notify=True), 1)
+        self.assertEqual(self.get_job().status, Job.STATUS_DONE)
+
+    def test_undelivered_job_is_retried(self):
+        self.assertEqual(self.run_claimed(), 0)
+        job = self.get_job()
+        self.assertEqual(job.status, Job.STATUS_PENDING)
+        self.assertGreater(job.run_at, now())
+
+    def test_exhausted_job_fails_its_row(self):
+        self.exhaust()
+        self.assertEqual(self.get_job().status, Job.STATUS_FAILED)
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, DeliveryMixin.STATUS_FAILED)
+
+    def test_saved_failed_row_isnt_rescheduled(self):
+        self.exhaust()
+        self.notification.refresh_from_db()
+        self.notification.save()
+        self.assertEqual(self.get_job().status, Job.STATUS_FAILED)
+
+    def test_edited_failed_row_is_rescheduled(self):
+        self.exhaust()
+        self.notification.refresh_from_db()
+        self.notification.notify_at = now() + timedelta(hours=1)
+        self.notification.save()
+        job = self.get_job()
+        self.assertEqual(job.status, Job.STATUS_PENDING)
+        self.assertEqual(job.attempts, 0)
+        self.assertEqual(job.run_at, self.notification.notify_at)
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, DeliveryMixin.STATUS_PENDING)
+
+
+class CursorPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.image = Image.objects.create(title='image', file='original_images/index.png', width=1, height=1)
+        for title in ['a', 'b', 'b', 'b', 'c']:
+            CCEE.objects.create(title=title, image=cls.image)
+        base = now() - timedelta(days=10)
+        for days in [0, 0, 0, 1, 2]:
+            CEFECHContent.objects.create(title='cefech', image=cls.image, publish_at=base + timedelta(days=days))
+
+    def setUp(self):
+        caches[settings.SNIPPET_API_CACHE].clear()
+
+    def get_page(self, url, cursor='', limit=2, **params):
+        response = self.client.get(url, dict(params, cursor=cursor, limit=limit))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [item['id'] for item in data['items']], data['meta']['next']
+
+    def get_all_pages(self, url):
+        ids = []
+        cursor = ''
+        while cursor is not None:
+            page, cursor = self.get_page(url, cursor)
+            self.assertLessEqual(len(page), 2)
+            ids += page
+        return ids
+
+    def test_title_ordering(self):
+        expected = list(CCEE.objects.order_by('title', 'id').values_list('id', flat=True))
+        self.assertEqual(self.get_all_pages('/api/v2/ccees/'), expected)
+
+    def test_publish_at_ordering(self):
+        expected = list(CEFECHContent.objects.order_by('-publish_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.get_all_pages('/api/v2/cefech/'), expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/v2/cefech/', {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+        # Valid encoding, but not a key of the (-publish_at, -id) ordering
+        response = self.client.get('/api/v2/cefech/', {'cursor': 'WzFd'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_with_cursor(self):
+        response = self.client.get('/api/v2/cefech/', {'cursor': '', 'order': 'title'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_insert_doesnt_shift_pages(self):
+        expected = list(CEFECHContent.objects.order_by('-publish_at', '-id').values_list('id', flat=True))
+        first_page, cursor = self.get_page('/api/v2/cefech/')
+        CEFECHContent.objects.create(title='newer', image=self.image, publish_at=now() - timedelta(minutes=1))
+        caches[settings.SNIPPET_API_CACHE].clear()
+        second_page, cursor = self.get_page('/api/v2/cefech/', cursor)
+        self.assertEqual(first_page + second_page, expected[:4])
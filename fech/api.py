@@ -1,20 +1,38 @@
 # api.py
-import re
 
-from django.db import models
+from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.signals import post_save, post_delete
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.utils.timezone import now
 from modelcluster.models import get_all_child_relations
 from rest_framework.filters import BaseFilterBackend
-from taggit.managers import TaggableManager
+from rest_framework.response import Response
 from wagtail.api.v2.endpoints import PagesAPIEndpoint, BaseAPIEndpoint
 from wagtail.api.v2.filters import OrderingFilter, FieldsFilter
 from wagtail.api.v2.router import WagtailAPIRouter
 from wagtail.api.v2.serializers import ChildRelationField, BaseSerializer
-from wagtail.api.v2.utils import parse_boolean, BadRequestError
+from wagtail.api.v2.utils import BadRequestError
 from wagtail.images.api.v2.endpoints import ImagesAPIEndpoint
 from wagtail.documents.api.v2.endpoints import DocumentsAPIEndpoint
+from wagtail.documents.models import Document
+from wagtail.images import get_image_model
 
-from blog.models import Event, New, Benefit, Place, CCEE, ONG, Transparency, Archive, CEFECHContent
+from blog.models import Event, New, Benefit, Place, CCEE, ONG, Transparency, Archive, CEFECHContent, ContentTags
+from blog.search import search, SEARCH_OPERATOR_AND, SEARCH_OPERATOR_OR
+from fech.cache import get_api_cache, get_models_version, get_next_boundary, get_cache_timeout, get_response_key, \
+    get_response_etag, bump_model_version, is_shared_cache
+from fech.filters import FilterPlan, filter_by_tags, TAG_MATCH_PARAMETER
+from fech.pagination import KeysetPagination
+
+
+Image = get_image_model()
+
+"""
+Models serialized with the contents (tags, image and author), their changes invalidate the cached responses
+"""
+CONTENT_CACHE_DEPENDENCIES = (ContentTags, Image, User)
 
 
 class CustomFilterBackend(BaseFilterBackend):
@@ -22,62 +40,160 @@ class CustomFilterBackend(BaseFilterBackend):
         """
         This performs field level filtering on the result set
         Eg: ?title=James Joyce
+        Eg: ?tags=a,b (tagged with a and b), ?tags=a,b&tag_match=any (tagged with a or b)
         """
-        fields = set(view.get_available_fields(queryset.model, db_fields_only=True))
-        query_parameters = view.request.GET.keys()
-        query_parameters = set(filter(lambda param: re.sub(r'__.*$', '', param) in fields and param.find('__') != -1, query_parameters))
-        fields = fields.union(query_parameters)
-
-        for field_name, value in request.GET.items():
-            if field_name in fields:
-                lookup = ''
-                if '__' in field_name:
-                    i = field_name.find('__')
-                    lookup = field_name[i:]
-                    field_name = field_name[:i]
-                try:
-                    field = queryset.model._meta.get_field(field_name)
-                except LookupError:
-                    field = None
-
-                # Convert value into python
-                try:
-                    if isinstance(field, (models.BooleanField, models.NullBooleanField)):
-                        value = parse_boolean(value)
-                    elif isinstance(field, (models.IntegerField, models.AutoField)):
-                        value = int(value)
-                except ValueError as e:
-                    raise BadRequestError("field filter error. '%s' is not a valid value for %s (%s)" % (
-                        value,
-                        field_name,
-                        str(e)
-                    ))
-
-                if isinstance(field, TaggableManager):
-                    for tag in value.split(','):
-                        queryset = queryset.filter(**{field_name + '__name': tag})
-
-                    # Stick a message on the queryset to indicate that tag filtering has been performed
-                    # This will let the do_search method know that it must raise an error as searching
-                    # and tag filtering at the same time is not supported
-                    queryset._filtered_by_tag = True
-                else:
-                    field_name = field_name + lookup
-                    queryset = queryset.filter(**{field_name: value})
+        plan = view.get_filter_plan(queryset.model)
+        for field_name, lookup, value, is_tag in plan.get_filters(request.GET):
+            if is_tag:
+                # A subquery instead of a join, so tag filtering composes with search
+                queryset = filter_by_tags(queryset, field_name, value, lookup)
+            else:
+                queryset = queryset.filter(**{field_name + lookup: value})
 
         return queryset
 
 
+class SearchDocumentFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        """
+        This performs full text search on the search document of the contents, most relevant first
+        Eg: ?search=beca&search_operator=or
+        """
+        search_query = request.GET.get('search')
+        if not search_query:
+            return queryset
+
+        if not any(field.name == 'search_document' for field in queryset.model._meta.get_fields()):
+            raise BadRequestError("search is not supported")
+        if KeysetPagination.cursor_query_param in request.GET:
+            raise BadRequestError("cursor pagination with a search query is not supported")
+
+        operator = request.GET.get('search_operator', SEARCH_OPERATOR_AND)
+        if operator not in (SEARCH_OPERATOR_AND, SEARCH_OPERATOR_OR):
+            raise BadRequestError("search_operator must be '%s' or '%s'" % (SEARCH_OPERATOR_AND, SEARCH_OPERATOR_OR))
+        return search(queryset, search_query, operator)
+
+
 class SnippetApiEndpoint(BaseAPIEndpoint):
     known_query_parameters = BaseAPIEndpoint.known_query_parameters.union([
         'type',
+        'cursor',
+        'search',
+        'search_operator',
+        TAG_MATCH_PARAMETER,
     ])
     filter_backends = [
         CustomFilterBackend,
+        SearchDocumentFilterBackend,
         OrderingFilter
     ]
 
+    """
+    Ordering used by the cursor pagination (?cursor=). It must end with a unique field.
+    """
+    cursor_ordering = ('id',)
+    cursor_pagination_class = KeysetPagination
+
+    """
+    Date fields whose next future value expires the cached responses (content being published or unpublished)
+    """
+    cache_boundary_fields = ()
 
+    """
+    Other models whose changes must invalidate the cached responses of this endpoint
+    """
+    cache_dependencies = ()
+
+    _filter_plans = {}
+
+    @property
+    def paginator(self):
+        """
+        Uses the cursor pagination when the cursor parameter is present, offset pagination otherwise.
+        """
+        if not hasattr(self, '_paginator'):
+            if KeysetPagination.cursor_query_param in self.request.GET:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    @classmethod
+    def get_cache_models(cls):
+        return (cls.model,) + tuple(cls.cache_dependencies)
+
+    def get_cached_response(self, view, view_name, *args, **kwargs):
+        """
+        Serves the response from cache when an identical request was already answered for the current
+        content version, without querying the database. Only successful responses are cached, with their
+        ETag and the time they were generated (Last-Modified), and clients that already have them get
+        304 Not Modified without any serialization.
+        Responses aren't cached (nor validated) when the cache is local to the process, as other processes
+        wouldn't see the version changes of their saves.
+        """
+        cache = get_api_cache()
+        if not is_shared_cache(cache):
+            return view(self.request, *args, **kwargs)
+
+        key = get_response_key(self.model._meta.label_lower, self.request.get_host(), view_name,
+                               get_models_version(self.get_cache_models()), self.request.GET)
+        cached = cache.get(key)
+        if cached is None:
+            response = view(self.request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cached = (response.data, get_response_etag(response.data), int(now().timestamp()))
+            boundary = get_next_boundary(self.model.objects.all(), self.cache_boundary_fields)
+            cache.set(key, cached, get_cache_timeout(boundary))
+
+        data, etag, last_modified = cached
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_related_lookups(self, model, field_names):
+        """
+        Splits the relations among the serialized fields into select_related and prefetch_related lookups.
+        """
+        select_related = []
+        prefetch_related = []
+        for field_name in field_names:
+            try:
+                field = model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                continue
+            if not field.is_relation:
+                continue
+            if (field.many_to_one or field.one_to_one) and field.concrete:
+                select_related.append(field_name)
+            else:
+                prefetch_related.append(field_name)
+        return select_related, prefetch_related
+
+    def plan_queryset(self, queryset):
+        """
+        Loads the relations serialized by the listing (api_fields selected by the fields parameter) with
+        the page, so serializing it runs the same number of queries regardless of its size.
+        """
+        select_related, prefetch_related = self.get_related_lookups(queryset.model,
+                                                                    self.get_serializer_class().Meta.fields)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        return super().paginate_queryset(self.plan_queryset(queryset))
+
+    def listing_view(self, request):
+        return self.get_cached_response(super().listing_view, 'listing')
+
+    def detail_view(self, request, pk):
+        return self.get_cached_response(super().detail_view, 'detail:%s' % pk, pk)
 
     # @classmethod
     # def get_available_fields(cls, model, db_fields_only=False):
@@ -88,22 +204,29 @@ class SnippetApiEndpoint(BaseAPIEndpoint):
     #         'publish_at__gte',
     #     ]
 
+    @classmethod
+    def get_filter_plan(cls, model):
+        """
+        Filtering metadata of the model for this endpoint, computed on the first request.
+        """
+        plan = cls._filter_plans.get((cls, model))
+        if plan is None:
+            plan = FilterPlan(model, cls.get_available_fields(model, db_fields_only=True), cls.known_query_parameters)
+            cls._filter_plans[(cls, model)] = plan
+        return plan
+
     def check_query_parameters(self, queryset):
         """
         Ensure that only valid query paramters are included in the URL.
         """
-        query_parameters = self.request.GET.keys()
-        query_parameters = set(map(lambda param: re.sub(r'__.*$', '', param ), query_parameters))
-
         # All query paramters must be either a database field or an operation
-        allowed_query_parameters = set(self.get_available_fields(queryset.model, db_fields_only=True)).union(self.known_query_parameters)
-        unknown_parameters = query_parameters - allowed_query_parameters
-        if unknown_parameters:
-            raise BadRequestError("query parameter is not an operation or a recognised field: %s" % ', '.join(sorted(unknown_parameters)))
+        self.get_filter_plan(queryset.model).check_parameters(self.request.GET)
 
 
 class EventSnippetAPIEndpoint(SnippetApiEndpoint):
     model = Event
+    cache_boundary_fields = ('publish_at', 'unpublish_at')
+    cache_dependencies = CONTENT_CACHE_DEPENDENCIES + (Place,)
 
     def get_queryset(self):
         return self.model.objects.filter(publish_at__lte=now()).exclude(unpublish_at__isnull=False, unpublish_at__lte=now()).all().order_by('id')
@@ -111,12 +234,16 @@ class EventSnippetAPIEndpoint(SnippetApiEndpoint):
 
 class NewSnippetAPIEndpoint(SnippetApiEndpoint):
     model = New
+    cache_boundary_fields = ('publish_at', 'unpublish_at')
+    cache_dependencies = CONTENT_CACHE_DEPENDENCIES
 
     def get_queryset(self):
         return self.model.objects.filter(publish_at__lte=now()).exclude(unpublish_at__isnull=False, unpublish_at__lte=now()).all().order_by('id')
 
 class BenefitSnippetAPIEndpoint(SnippetApiEndpoint):
     model = Benefit
+    cache_boundary_fields = ('publish_at', 'unpublish_at')
+    cache_dependencies = CONTENT_CACHE_DEPENDENCIES
 
     def get_queryset(self):
         return self.model.objects.filter(publish_at__lte=now()).exclude(unpublish_at__isnull=False, unpublish_at__lte=now()).all().order_by('id')
@@ -134,6 +261,8 @@ class PlaceSnippetAPIEndpoint(SnippetApiEndpoint):
 
 class CCEESnippetAPIEndpoint(SnippetApiEndpoint):
     model = CCEE
+    cache_dependencies = (Image,)
+    cursor_ordering = ('title', 'id')
 
     def get_queryset(self):
         return self.model.objects.filter(published=True).all().order_by('title')
@@ -141,6 +270,8 @@ class CCEESnippetAPIEndpoint(SnippetApiEndpoint):
 
 class ONGSnippetAPIEndpoint(SnippetApiEndpoint):
     model = ONG
+    cache_dependencies = (Image,)
+    cursor_ordering = ('title', 'id')
 
     def get_queryset(self):
         return self.model.objects.filter(published=True).all().order_by('title')
@@ -148,6 +279,8 @@ class ONGSnippetAPIEndpoint(SnippetApiEndpoint):
 
 class TransparencySnippetAPIEndpoint(SnippetApiEndpoint):
     model = Transparency
+    cache_dependencies = (Image, Document)
+    cursor_ordering = ('-publish_at', '-id')
 
     def get_queryset(self):
         return self.model.objects.filter(published=True).all().order_by('-publish_at')
@@ -155,6 +288,8 @@ class TransparencySnippetAPIEndpoint(SnippetApiEndpoint):
 
 class ArchiveSnippetAPIEndpoint(SnippetApiEndpoint):
     model = Archive
+    cache_dependencies = (Image, Document)
+    cursor_ordering = ('-publish_at', '-id')
 
     def get_queryset(self):
         return self.model.objects.filter(published=True).all().order_by('-publish_at')
@@ -162,6 +297,9 @@ class ArchiveSnippetAPIEndpoint(SnippetApiEndpoint):
 
 class CEFECHSnippetAPIEndpoint(SnippetApiEndpoint):
     model = CEFECHContent
+    cursor_ordering = ('-publish_at', '-id')
+    cache_boundary_fields = ('publish_at', 'unpublish_at')
+    cache_dependencies = CONTENT_CACHE_DEPENDENCIES
 
     def get_queryset(self):
         return self.model.objects.filter(publish_at__lte=now()).exclude(unpublish_at__isnull=False, unpublish_at__lte=now()).all().order_by('-publish_at')
@@ -184,4 +322,19 @@ api_router.register_endpoint('ccees', CCEESnippetAPIEndpoint)
 api_router.register_endpoint('ongs', ONGSnippetAPIEndpoint)
 api_router.register_endpoint('transparency', TransparencySnippetAPIEndpoint)
 api_router.register_endpoint('archives', ArchiveSnippetAPIEndpoint)
-api_router.register_endpoint('cefech', CEFECHSnippetAPIEndpoint)
\ No newline at end of file
+api_router.register_endpoint('cefech', CEFECHSnippetAPIEndpoint)
+
+
+def invalidate_snippet_api_cache(sender, **kwargs):
+    bump_model_version(sender)
+
+
+# Invalidate cached responses whenever a model used by an endpoint is saved or deleted
+cached_endpoints = [
+    EventSnippetAPIEndpoint, BenefitSnippetAPIEndpoint, NewSnippetAPIEndpoint, PlaceSnippetAPIEndpoint,
+    CCEESnippetAPIEndpoint, ONGSnippetAPIEndpoint, TransparencySnippetAPIEndpoint, ArchiveSnippetAPIEndpoint,
+    CEFECHSnippetAPIEndpoint,
+]
+for model in set(model for endpoint in cached_endpoints for model in endpoint.get_cache_models()):
+    post_save.connect(invalidate_snippet_api_cache, sender=model, dispatch_uid='snippet_api_cache_save')
+    post_delete.connect(invalidate_snippet_api_cache, sender=model, dispatch_uid='snippet_api_cache_delete')
@@ -0,0 +1,102 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Min
+from django.utils.http import quote_etag
+from django.utils.timezone import now
+
+
+def get_api_cache():
+    return caches[getattr(settings, 'SNIPPET_API_CACHE', 'default')]
+
+
+def is_shared_cache(cache):
+    """
+    Tells if the cache is shared by the server processes, so the versions bumped by one are seen by all.
+    """
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+def get_version_key(model):
+    return 'snippet-api:version:%s' % model._meta.label_lower
+
+
+def get_model_version(model):
+    """
+    Current content version of the model. It changes every time an instance of the model is saved or deleted.
+    """
+    return get_models_versions([model])[0]
+
+
+def get_models_versions(models):
+    """
+    Current content versions of the models, read with a single cache request.
+    """
+    cache = get_api_cache()
+    keys = [get_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, 1, None)
+            versions[key] = 1
+    return [versions[key] for key in keys]
+
+
+def bump_model_version(model):
+    cache = get_api_cache()
+    key = get_version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def get_models_version(models):
+    return '.'.join(str(version) for version in get_models_versions(models))
+
+
+def get_next_boundary(queryset, fields):
+    """
+    Returns the closest future datetime in the specified fields of the queryset, or None if there isn't any.
+    Used to expire cached responses when a content gets published or unpublished.
+    """
+    if not fields:
+        return None
+    dt_now = now()
+    boundaries = []
+    for field in fields:
+        boundary = queryset.filter(**{'%s__gt' % field: dt_now}).aggregate(next=Min(field))['next']
+        if boundary is not None:
+            boundaries.append(boundary)
+    return min(boundaries) if boundaries else None
+
+
+def get_cache_timeout(boundary):
+    timeout = getattr(settings, 'SNIPPET_API_CACHE_TIMEOUT', 300)
+    if boundary is not None:
+        seconds = int((boundary - now()).total_seconds()) + 1
+        timeout = max(1, min(timeout, seconds))
+    return timeout
+
+
+def normalize_query_string(query_dict):
+    items = sorted((key, value) for key in query_dict.keys() for value in query_dict.getlist(key))
+    return '&'.join('%s=%s' % item for item in items)
+
+
+def get_response_key(prefix, host, view_name, version, query_dict):
+    query = hashlib.md5(normalize_query_string(query_dict).encode('utf-8')).hexdigest()
+    return 'snippet-api:response:%s:%s:%s:%s:%s' % (prefix, host, view_name, version, query)
+
+
+def get_response_etag(data):
+    """
+    ETag of the serialized data of a response, so it changes exactly when the response does.
+    """
+    content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return quote_etag(hashlib.md5(content.encode('utf-8')).hexdigest())
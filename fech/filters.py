@@ -0,0 +1,114 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Count
+from taggit.managers import TaggableManager
+from wagtail.api.v2.utils import parse_boolean, BadRequestError
+
+
+"""
+Query parameter telling if the objects must have all the tags of the filter (default) or any of them
+"""
+TAG_MATCH_PARAMETER = 'tag_match'
+TAG_MATCH_ALL = 'all'
+TAG_MATCH_ANY = 'any'
+
+
+def filter_by_tags(queryset, field_name, tags, match=TAG_MATCH_ALL):
+    """
+    Filters the objects tagged with all or any of the tags through a single subquery on the tags table,
+    so the query doesn't grow with the number of tags and doesn't repeat rows.
+    """
+    tagged = queryset.model._meta.get_field(field_name).through.objects.filter(tag__name__in=tags)
+    if match == TAG_MATCH_ALL:
+        tagged = tagged.values('content_object').annotate(matches=Count('tag', distinct=True))\
+            .filter(matches=len(set(tags)))
+    return queryset.filter(pk__in=tagged.values('content_object'))
+
+
+def get_coercer(field):
+    """
+    Function converting query parameter values of the field into python.
+    """
+    if isinstance(field, (models.BooleanField, models.NullBooleanField)):
+        return parse_boolean
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return int
+    return None
+
+
+class FilterPlan:
+    """
+    Field level filtering of a model through the query parameters (eg: ?title=James Joyce,
+    ?publish_at__gte=2020-01-01), computed once per endpoint and model. The parsed filters of recent
+    query strings are cached, so parsing a request is a dictionary lookup.
+    """
+    cache_size = 512
+
+    def __init__(self, model, fields, known_query_parameters):
+        self.fields = frozenset(fields)
+        self.allowed_parameters = self.fields.union(known_query_parameters)
+        self.coercers = {}
+        self.tag_fields = set()
+        for field_name in self.fields:
+            try:
+                field = model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                continue
+            if isinstance(field, TaggableManager):
+                self.tag_fields.add(field_name)
+            coercer = get_coercer(field)
+            if coercer is not None:
+                self.coercers[field_name] = coercer
+        self.get_unknown_parameters = lru_cache(maxsize=self.cache_size)(self.get_unknown_parameters)
+        self.parse_filters = lru_cache(maxsize=self.cache_size)(self.parse_filters)
+
+    def get_unknown_parameters(self, parameters):
+        """
+        Query parameters that are not a database field or an operation, given a frozenset of names.
+        """
+        return sorted(set(parameter.split('__', 1)[0] for parameter in parameters) - self.allowed_parameters)
+
+    def check_parameters(self, query_dict):
+        unknown_parameters = self.get_unknown_parameters(frozenset(query_dict.keys()))
+        if unknown_parameters:
+            raise BadRequestError("query parameter is not an operation or a recognised field: %s" % ', '.join(unknown_parameters))
+
+    def get_filter_items(self, query_dict):
+        """
+        Normalized filter parameters of a query dict: the last value of each parameter naming a field,
+        sorted so the same filters in any order share the cached plan.
+        """
+        return tuple(sorted((name, value) for name, value in query_dict.items()
+                            if name.split('__', 1)[0] in self.fields))
+
+    def parse_filters(self, items, tag_match=TAG_MATCH_ALL):
+        """
+        Converts filter items into (field name, lookup, value, is tag) tuples. The lookup of tag filters is
+        the tag match (all or any).
+        """
+        if tag_match not in (TAG_MATCH_ALL, TAG_MATCH_ANY):
+            raise BadRequestError("%s must be '%s' or '%s'" % (TAG_MATCH_PARAMETER, TAG_MATCH_ALL, TAG_MATCH_ANY))
+        filters = []
+        for name, value in items:
+            field_name, sep, lookup = name.partition('__')
+            coercer = self.coercers.get(field_name)
+            try:
+                if coercer is not None:
+                    value = coercer(value)
+            except ValueError as e:
+                raise BadRequestError("field filter error. '%s' is not a valid value for %s (%s)" % (
+                    value,
+                    field_name,
+                    str(e)
+                ))
+            if field_name in self.tag_fields:
+                filters.append((field_name, tag_match, tuple(value.split(',')), True))
+            else:
+                filters.append((field_name, sep + lookup, value, False))
+        return tuple(filters)
+
+    def get_filters(self, query_dict):
+        return self.parse_filters(self.get_filter_items(query_dict),
+                                  query_dict.get(TAG_MATCH_PARAMETER, TAG_MATCH_ALL))
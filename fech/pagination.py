@@ -0,0 +1,97 @@
+import base64
+import json
+from collections import OrderedDict
+from functools import reduce
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from wagtail.api.v2.utils import BadRequestError
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor based pagination. Each page is fetched by filtering on the ordering key of the last
+    item of the previous page, so deep pages cost the same as the first one and contents published
+    while scrolling don't shift the following pages.
+
+    The ordering is taken from the view's cursor_ordering and must end with a unique field.
+    Eg: ?cursor=&limit=10, then ?cursor=<meta.next>&limit=10
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if 'order' in request.GET:
+            raise BadRequestError("ordering is not supported with cursor pagination")
+
+        self.ordering = view.cursor_ordering
+        self.model = queryset.model
+        limit = self.get_limit(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        values = self.decode_cursor(request.GET.get(self.cursor_query_param))
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values))
+
+        results = list(queryset[:limit + 1])
+        self.has_next = len(results) > limit
+        results = results[:limit]
+        self.next_cursor = self.encode_cursor(results[-1]) if self.has_next else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('meta', OrderedDict([
+                ('next', self.next_cursor),
+            ])),
+            ('items', data),
+        ]))
+
+    def get_limit(self, request):
+        limit_max = getattr(settings, 'WAGTAILAPI_LIMIT_MAX', 20)
+        try:
+            limit = int(request.GET.get(self.limit_query_param, min(20, limit_max or 20)))
+            if limit < 1:
+                raise ValueError()
+        except ValueError:
+            raise BadRequestError("limit must be a positive integer")
+        if limit_max and limit > limit_max:
+            raise BadRequestError("limit cannot be higher than %d" % limit_max)
+        return limit
+
+    def get_keyset_filter(self, values):
+        """
+        Builds the filter of the items placed after the given key values
+        Eg: for ('-publish_at', '-id'): publish_at < v0 OR (publish_at = v0 AND id < v1)
+        """
+        conditions = []
+        for i, ordering in enumerate(self.ordering):
+            field_name = ordering.lstrip('-')
+            lookup = 'lt' if ordering.startswith('-') else 'gt'
+            filters = {self.ordering[j].lstrip('-'): values[j] for j in range(i)}
+            filters['%s__%s' % (field_name, lookup)] = values[i]
+            conditions.append(Q(**filters))
+        return reduce(lambda a, b: a | b, conditions)
+
+    def encode_cursor(self, instance):
+        values = []
+        for ordering in self.ordering:
+            value = getattr(instance, ordering.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError()
+            return [
+                self.model._meta.get_field(ordering.lstrip('-')).to_python(value)
+                for ordering, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise BadRequestError("invalid cursor")
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'rest_framework',
 
     'wagtail.contrib.forms',
+    'wagtail.contrib.postgres_search',
     'wagtail.contrib.redirects',
     'wagtail.embeds',
     'wagtail.sites',
@@ -120,6 +121,23 @@ DATABASES = {
 }
 
 
+# Cache
+# Snippet API responses are only cached with a backend shared by every server process. docker-compose runs
+# memcached and sets CACHE_BACKEND and CACHE_LOCATION to it, the local memory default doesn't cache them
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Cache alias and max seconds used to store snippet API responses
+SNIPPET_API_CACHE = 'default'
+SNIPPET_API_CACHE_TIMEOUT = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -181,6 +199,17 @@ MEDIA_URL = '/media/'
 
 WAGTAIL_SITE_NAME = "fech"
 
+# Full text search on PostgreSQL, for pages (Wagtail backend) and snippet contents (blog.search)
+SEARCH_CONFIG = 'spanish'
+WAGTAILSEARCH_BACKENDS = {
+    'default': {
+        'BACKEND': 'wagtail.contrib.postgres_search.backend',
+        'SEARCH_CONFIG': SEARCH_CONFIG,
+    },
+}
+# Seconds between writes of the search hits recorded by the /search/ view
+SEARCH_HITS_FLUSH_INTERVAL = 30
+
 # Base URL to use when referring to full URLs within the Wagtail admin backend -
 # e.g. in notification emails. Don't include '/admin' or a trailing slash
 BASE_URL = 'http://example.com'
@@ -205,12 +234,29 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 EMAIL_USE_TLS = True
 
+# Max number of recipients per notification email
+NOTIFICATION_EMAIL_BATCH_SIZE = 50
+
 # Cron jobs
 CRON_CLASSES = [
     "blog.cron.PostPublicationsJob",
     "blog.cron.SendNotificationsJob",
 ]
 
+# Job queue (python manage.py run_jobs)
+JOB_QUEUE_POLL_INTERVAL = 5
+JOB_QUEUE_LEASE = int(os.getenv('JOB_QUEUE_LEASE', 600))
+JOB_QUEUE_MAX_ATTEMPTS = 5
+JOB_QUEUE_RETRY_DELAY = 60
+
+# Seconds after which notifications and sharings claimed by a sender that didn't start sending them
+# (eg: its process died) can be claimed again
+DELIVERY_CLAIM_LEASE = int(os.getenv('DELIVERY_CLAIM_LEASE', 600))
+
+# Seconds after their claim from which notifications and sharings still being sent are marked as failed,
+# so rows left by a sender that died while sending them don't stay in that state forever
+DELIVERY_POSTING_LEASE = int(os.getenv('DELIVERY_POSTING_LEASE', 3600))
+
 # FCM
 FCM_DJANGO_SETTINGS = {
         "APP_VERBOSE_NAME": "FCM Django",
@@ -220,12 +266,46 @@ FCM_DJANGO_SETTINGS = {
 }
 FIREBASE_API_KEY = os.getenv('FIREBASE_API_KEY')
 
+# Concurrent requests and timeout (seconds) used to send push notifications
+PUSH_NOTIFICATION_WORKERS = 4
+PUSH_NOTIFICATION_TIMEOUT = 5
+
 
 # Social publications
 
+# Images converted for the social networks, cached up to SOCIAL_MEDIA_CACHE_SIZE bytes
+SOCIAL_MEDIA_CACHE_DIR = os.getenv('SOCIAL_MEDIA_CACHE_DIR', os.path.join(BASE_DIR, 'social_media_cache'))
+SOCIAL_MEDIA_CACHE_SIZE = int(os.getenv('SOCIAL_MEDIA_CACHE_SIZE', 200 * 1024 * 1024))
+
+# Concurrent posts and max posts per minute (0 is unlimited) of each social network. The Instagram
+# client is shared by the process and isn't thread safe, so it posts one at a time
+SOCIAL_PUBLISHING_WORKERS = {
+    'TWITTER': 4,
+    'INSTAGRAM': 1,
+}
+SOCIAL_PUBLISHING_RATE = {
+    'TWITTER': 30,
+    'INSTAGRAM': 10,
+}
+# Results of the posts written to the database at once
+SOCIAL_PUBLISHING_FLUSH_SIZE = 20
+
 # Instagram
 INSTAGRAM_USER = os.getenv('INSTAGRAM_USER')
 INSTAGRAM_PWD = os.getenv('INSTAGRAM_PWD')
+# Stored session, reused between runs to avoid login requests
+INSTAGRAM_SESSION_FILE = os.getenv('INSTAGRAM_SESSION_FILE', os.path.join(BASE_DIR, 'instagram_session.json'))
+# Retries of failed requests (see social.InstagramAPI.retry.RetryPolicy) and request timeout in seconds
+INSTAGRAM_RETRY = {
+    'max_attempts': 3,
+    'base_delay': 1.0,
+    'max_delay': 30.0,
+    'deadline': 90.0,
+}
+INSTAGRAM_TIMEOUT = 30
+# Reuse connections to Instagram hosts, with up to INSTAGRAM_POOL_MAXSIZE connections per host
+INSTAGRAM_KEEP_ALIVE = True
+INSTAGRAM_POOL_MAXSIZE = 4
 
 
 # Twitter
@@ -1,3 +1,28 @@
 from django.db import models
 
-# Create your models here.
\ No newline at end of file
+
+class DeliveryMixin(models.Model):
+    """
+    Delivery state of a notification or sharing. Senders claim due rows before sending them, mark them as
+    being sent right before the request and as done or failed after it, so overlapping runs and workers
+    never send the same row twice. Rows left being sent past a lease (eg: the sender died) are marked as failed.
+    """
+    STATUS_PENDING = 'PENDING'
+    STATUS_CLAIMED = 'CLAIMED'
+    STATUS_POSTING = 'POSTING'
+    STATUS_DONE = 'DONE'
+    STATUS_FAILED = 'FAILED'
+    status = models.CharField('Estado de envío', max_length=16, choices=[
+        (STATUS_PENDING, 'Pendiente'),
+        (STATUS_CLAIMED, 'Tomado'),
+        (STATUS_POSTING, 'Enviando'),
+        (STATUS_DONE, 'Enviado'),
+        (STATUS_FAILED, 'Fallido'),
+    ], default=STATUS_PENDING)
+    """
+    Claim of the row, also used as token so a sender only updates the rows it claimed
+    """
+    claimed_at = models.DateTimeField('Tomado el', null=True, blank=True)
+
+    class Meta:
+        abstract = True
@@ -1,13 +1,22 @@
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import Q
 from django.template.loader import get_template
 from django.utils.timezone import now
 
 from django.core import mail
-from pyfcm import FCMNotification
 from sentry_sdk import capture_exception
 
 from fech.settings.base import FIREBASE_API_KEY
+from notifications.models import DeliveryMixin
 from django.template import Template, Context
 
 """
@@ -29,8 +38,20 @@ class BaseNotificationProvider:
     """
     channel_field = 'channel'
 
+    """
+    Seconds after which claimed notifications that weren't sent can be claimed again
+    """
+    lease = getattr(settings, 'DELIVERY_CLAIM_LEASE', 600)
+
+    """
+    Seconds after their claim from which notifications still being sent are considered abandoned (eg: the
+    sender process died mid-run)
+    """
+    posting_lease = getattr(settings, 'DELIVERY_POSTING_LEASE', 3600)
+
     def __init__(self, notifications):
         self.notifications = notifications
+        self.claimed_at = None
 
     '''
     Get notifications that need to be send through the specified channel
@@ -43,36 +64,116 @@ class BaseNotificationProvider:
         }
         return self.notifications.filter(**filters)
 
+    def get_claimed(self, pks=None, status=DeliveryMixin.STATUS_CLAIMED):
+        """
+        Notifications claimed by this provider in the given status, restricted to pks if any.
+        """
+        claimed = self.notifications.model.objects.filter(status=status, claimed_at=self.claimed_at)
+        if pks is not None:
+            claimed = claimed.filter(pk__in=pks)
+        return claimed
+
+    def recover_notifications(self, channel):
+        """
+        Marks the notifications of the channel abandoned while being sent as failed. They may have been
+        sent, so they aren't retried. A sender still running can't mark them as done afterwards.
+        """
+        expired_at = now() - timedelta(seconds=self.posting_lease)
+        self.notifications.model.objects.filter(**{self.channel_field: channel})\
+            .filter(status=DeliveryMixin.STATUS_POSTING, claimed_at__lt=expired_at)\
+            .update(**self.get_failed_values())
+
+    def claim_notifications(self, channel):
+        """
+        Claims the due notifications of the channel. Rows locked by another sender are skipped and
+        the claim is a conditional update, so each row is claimed by a single sender.
+        """
+        self.recover_notifications(channel)
+        dt_now = now()
+        due = self.get_notifications(channel).filter(
+            Q(status=DeliveryMixin.STATUS_PENDING) |
+            Q(status=DeliveryMixin.STATUS_CLAIMED, claimed_at__lt=dt_now - timedelta(seconds=self.lease)))
+        with transaction.atomic():
+            pks = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True))
+            self.notifications.model.objects.filter(pk__in=pks)\
+                .update(status=DeliveryMixin.STATUS_CLAIMED, claimed_at=dt_now)
+        self.claimed_at = dt_now
+        return self.get_claimed(pks)
+
+    def start(self, pks):
+        """
+        Marks claimed notifications as being sent, right before sending them. Returns the pks still claimed
+        by this provider, only those can be sent.
+        """
+        with transaction.atomic():
+            pks = list(self.get_claimed(pks).select_for_update().values_list('pk', flat=True))
+            self.notifications.model.objects.filter(pk__in=pks).update(status=DeliveryMixin.STATUS_POSTING)
+        return pks
+
+    def get_done_values(self):
+        return {'status': DeliveryMixin.STATUS_DONE, self.notified_field: True}
+
+    def get_failed_values(self):
+        return {'status': DeliveryMixin.STATUS_FAILED}
+
+    def get_released_values(self):
+        return {'status': DeliveryMixin.STATUS_PENDING, 'claimed_at': None}
+
+    def mark_done(self, pks):
+        self.get_claimed(pks, DeliveryMixin.STATUS_POSTING).update(**self.get_done_values())
+
+    def mark_failed(self, pks=None):
+        """
+        Notifications that may have been sent are never retried.
+        """
+        self.get_claimed(pks, DeliveryMixin.STATUS_POSTING).update(**self.get_failed_values())
+
+    def release(self, pks=None, status=DeliveryMixin.STATUS_POSTING):
+        """
+        Returns notifications known not to be sent to pending, so they're retried.
+        """
+        self.get_claimed(pks, status).update(**self.get_released_values())
+
 
 class BaseNotificationSender:
     channel = None
 
     def __init__(self, provider, title='Tienes una notificación'):
         self.provider = provider
-        self.notifications = self.provider.get_notifications(self.channel)
+        self.notifications = self.provider.claim_notifications(self.channel)
+        self.started_ids = []
         self.title = title
 
     def send_notifications(self, users):
-        print('Sending %d notifications through %s' % (self.notifications.count(), self.channel))
+        pks = self.provider.start(list(self.notifications.values_list('pk', flat=True)))
+        self.notifications = self.provider.get_claimed(pks, DeliveryMixin.STATUS_POSTING)
+        self.started_ids = pks
+        print('Sending %d notifications through %s' % (len(pks), self.channel))
+        sent = False
         try:
             sent = self.send(self.notifications, users)
         except Exception as e:
             print(e)
             capture_exception(e)
+            # Some messages may have been sent
+            self.provider.mark_failed(pks)
+            return
         if sent:
             self.after_send()
+        self.provider.release(pks)
 
     def send(self, notifications, users):
         pass
 
     def after_send(self):
-        self.notifications.update(**{self.provider.notified_field: True})
+        self.provider.mark_done(self.started_ids)
 
 
 class EmailNotificationSender(BaseNotificationSender):
 
     channel = 'EMAIL'
     template_field = 'template'
+    template_name = 'notifications/default_email.html'
     object_notification_mapping = {
         'subject': 'title',
         'body': 'body_as_html',
@@ -82,43 +183,80 @@ class EmailNotificationSender(BaseNotificationSender):
         'reply_to': ''
     }
 
+    """
+    Max number of recipients of a single message
+    """
+    batch_size = getattr(settings, 'NOTIFICATION_EMAIL_BATCH_SIZE', 50)
+
     def __init__(self, provider, object_field, title='Tienes una notificación'):
-        super().__init__(provider, title='Tienes una notificación')
+        super().__init__(provider, title=title)
         self.object_field = object_field
+        self.template = get_template(self.template_name)
 
     def get_object(self, notification):
         return getattr(notification, self.object_field)
 
-    def build_notification_message(self, notification, users):
+    def get_recipient_batches(self, recipients):
+        """
+        Lazily splits the recipient emails into batches of batch_size, so only one batch is held in memory.
+        """
+        iterator = iter(recipients)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def build_notification_messages(self, notification, recipients, connection):
+        """
+        Renders the notification once and yields one message per batch of recipients.
+        Recipients go in bcc so they don't see each other's address.
+        """
         object_data = self.get_object(notification)
-        template = get_template('notifications/default_email.html')
-        msg = EmailMultiAlternatives(
-            subject=self.title,
-            body='',
-            from_email='Notificaciones <' + 'report@suplebest.cl' + '>',
-            to=list(map(lambda u: u.email, users)),
-            cc=[],
-            reply_to=['dudas@fech.cl']
-        )
-
-        html_message = template.render(object_data.__dict__)
-        msg.attach_alternative(html_message, "text/html")
-        msg.send()
-        return msg
-
-    def build_messages(self, notifications, users):
-        messages = []
-        for notification in notifications:
-            messages.append(self.build_notification_message(notification, users))
-        return messages
+        html_message = self.template.render(object_data.__dict__)
+        for batch in self.get_recipient_batches(recipients):
+            msg = EmailMultiAlternatives(
+                subject=self.title,
+                body='',
+                from_email='Notificaciones <' + 'report@suplebest.cl' + '>',
+                bcc=batch,
+                reply_to=['dudas@fech.cl'],
+                connection=connection
+            )
+            msg.attach_alternative(html_message, "text/html")
+            yield msg
+
+    def send(self, notifications, recipients):
+        start = time.time()
+        processed = 0
+        sent = 0
+        addresses = 0
+        # A single SMTP session is used for every notification and batch
+        with mail.get_connection() as connection:
+            for notification in notifications:
+                for msg in self.build_notification_messages(notification, recipients, connection):
+                    sent += connection.send_messages([msg]) or 0
+                    addresses += len(msg.bcc)
+                processed += 1
+        elapsed = time.time() - start
+        print('Sent %d notifications in %d emails to %d addresses in %.2fs (%.1f emails/s)' % (
+            processed, sent, addresses, elapsed, sent / elapsed if elapsed else 0))
+        return processed > 0
+
+
+class EmailRecipients:
+    """
+    Streams the email addresses of the active users with an address. Each iteration runs a new query
+    read in chunks (server side cursor on PostgreSQL), so memory stays flat regardless of the number of users.
+    """
+    chunk_size = 2000
 
-    def send(self, notifications, users):
-        messages = self.build_messages(notifications, users)
-        connection = mail.get_connection()
-        if len(messages) > 0:
-            connection.send_messages(messages)
-            return True
-        return False
+    def __init__(self, users):
+        self.users = users
+
+    def __iter__(self):
+        return self.users.filter(is_active=True).exclude(email='').exclude(email__isnull=True)\
+            .values_list('email', flat=True).order_by().iterator(chunk_size=self.chunk_size)
 
 
 class PushNotificationSender(BaseNotificationSender):
@@ -130,6 +268,16 @@ class PushNotificationSender(BaseNotificationSender):
         'body': 'body_as_html',
     }
 
+    """
+    Max number of concurrent requests to FCM
+    """
+    max_workers = getattr(settings, 'PUSH_NOTIFICATION_WORKERS', 4)
+
+    """
+    Seconds to wait for each FCM request
+    """
+    timeout = getattr(settings, 'PUSH_NOTIFICATION_TIMEOUT', 5)
+
     def get_object(self, notification):
         return getattr(notification, self.object_field)
 
@@ -137,31 +285,74 @@ class PushNotificationSender(BaseNotificationSender):
         super().__init__(provider, title=title)
         self.object_field = object_field
         self.topic = topic
+        self.topic_template = Template(topic)
+        self.templates = {}
+        self.clients = threading.local()
+        self.sent_ids = []
+
+    def get_template(self, template_str):
+        """
+        Compiles each template string once per sender.
+        """
+        template = self.templates.get(template_str)
+        if template is None:
+            template = Template(template_str)
+            self.templates[template_str] = template
+        return template
+
+    def get_push_service(self):
+        """
+        One FCM client (and its HTTP session) per worker thread, reused for all its requests.
+        """
+        push_service = getattr(self.clients, 'push_service', None)
+        if push_service is None:
+            from pyfcm import FCMNotification
+            push_service = FCMNotification(api_key=FIREBASE_API_KEY)
+            self.clients.push_service = push_service
+        return push_service
 
     def build_notification_body(self, notification):
         object_data = self.get_object(notification)
         template_str = getattr(object_data, self.object_notification_mapping.get('subject'))
-        template = Template(template_str)
+        template = self.get_template(template_str)
         return template.render(Context(object_data.__dict__))
 
     def get_topic(self, object_data):
-        template = Template(self.topic)
-        topic = template.render(Context(object_data.__dict__))
+        topic = self.topic_template.render(Context(object_data.__dict__))
         return topic
 
+    def build_message(self, notification):
+        object_data = self.get_object(notification)
+        return {
+            'topic_name': self.get_topic(object_data),
+            'message_body': self.build_notification_body(notification),
+            'message_title': self.title,
+            'click_action': 'FLUTTER_NOTIFICATION_CLICK',
+            'data_message': {
+                'type': self.object_field,
+                'id': object_data.pk
+            },
+        }
+
+    def send_message(self, notification_id, message):
+        try:
+            self.get_push_service().notify_topic_subscribers(timeout=self.timeout, **message)
+        except Exception as e:
+            print(e)
+            capture_exception(e)
+            return None
+        return notification_id
 
     def send(self, notifications, users):
-        for notification in notifications:
-            object_data = self.get_object(notification)
-            push_service = FCMNotification(api_key=FIREBASE_API_KEY)
-            response = push_service.notify_topic_subscribers(
-                topic_name=self.get_topic(object_data),
-                message_body=self.build_notification_body(notification),
-                message_title=self.title,
-                click_action='FLUTTER_NOTIFICATION_CLICK',
-                data_message={
-                    'type': self.object_field,
-                    'id': object_data.pk
-                }
-            )
-        return True
+        # Messages are rendered here, as they need DB access, and only the requests run in the pool
+        messages = [(notification.pk, self.build_message(notification)) for notification in notifications]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(lambda args: self.send_message(*args), messages)
+            self.sent_ids = [notification_id for notification_id in results if notification_id is not None]
+        return len(self.sent_ids) > 0
+
+    def after_send(self):
+        """
+        Marks only the notifications whose request succeeded, failed ones are retried on the next run.
+        """
+        self.provider.mark_done(self.sent_ids)
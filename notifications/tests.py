@@ -1,3 +1,39 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils.timezone import now
+from wagtail.images.models import Image
+
+from blog.models import Event, EventNotification
+from notifications.models import DeliveryMixin
+from notifications.notifiers import BaseNotificationProvider
+
+
+class RecoverNotificationsTest(TestCase):
+
+    def setUp(self):
+        image = Image.objects.create(title='image', file='original_images/index.png', width=1, height=1)
+        event = Event.objects.create(title='event', image=image, start=now())
+        self.provider = BaseNotificationProvider(EventNotification.objects.all())
+        self.stale = self.create_notification(event, now() - timedelta(seconds=self.provider.posting_lease + 60))
+        self.recent = self.create_notification(event, now())
+
+    def create_notification(self, event, claimed_at):
+        notification = EventNotification.objects.create(event=event, channel=EventNotification.CHANNEL_EMAIL)
+        EventNotification.objects.filter(pk=notification.pk)\
+            .update(status=DeliveryMixin.STATUS_POSTING, claimed_at=claimed_at)
+        return notification
+
+    def get_status(self, notification):
+        notification.refresh_from_db()
+        return notification.status
+
+    def test_abandoned_notifications_are_failed(self):
+        claimed = self.provider.claim_notifications(EventNotification.CHANNEL_EMAIL)
+        self.assertEqual(self.get_status(self.stale), DeliveryMixin.STATUS_FAILED)
+        self.assertEqual(self.get_status(self.recent), DeliveryMixin.STATUS_POSTING)
+        self.assertFalse(claimed.exists())
 
-# Create your tests here.
+    def test_other_channels_are_kept(self):
+        self.provider.recover_notifications(EventNotification.CHANNEL_MOBILE)
+        self.assertEqual(self.get_status(self.stale), DeliveryMixin.STATUS_POSTING)
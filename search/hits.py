@@ -0,0 +1,81 @@
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction, InterfaceError, OperationalError
+from django.utils.timezone import now
+from wagtail.search.models import Query, QueryDailyHits
+from wagtail.search.utils import normalise_query_string
+
+"""
+Seconds between writes of the buffered search hits
+"""
+FLUSH_INTERVAL = getattr(settings, 'SEARCH_HITS_FLUSH_INTERVAL', 30)
+
+UPSERT_DAILY_HITS_SQL = """
+INSERT INTO {table} (query_id, date, hits) VALUES (%s, %s, %s)
+ON CONFLICT (query_id, date) DO UPDATE SET hits = {table}.hits + EXCLUDED.hits
+"""
+
+
+def record_hits(query_string, date, hits):
+    """
+    Adds hits to the daily hits of a query with a single upsert.
+    """
+    query = Query.get(query_string)
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_DAILY_HITS_SQL.format(table=connection.ops.quote_name(QueryDailyHits._meta.db_table)),
+                       [query.pk, date, hits])
+
+
+class HitBuffer:
+    """
+    Counts search hits in memory and writes them from a background thread every interval, one upsert
+    per query and day, so searches don't wait for (and contend on) the hit counters.
+    """
+    def __init__(self, interval=FLUSH_INTERVAL):
+        self.interval = interval
+        self.hits = Counter()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, query_string):
+        with self.lock:
+            # Longer queries don't fit in Query.query_string
+            query_string = normalise_query_string(query_string)[:Query._meta.get_field('query_string').max_length]
+            self.hits[(query_string, now().date())] += 1
+            # Started on the first hit, so each (eg: forked) server process has its own flusher
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='search-hits', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+            # Don't keep an idle connection between flushes
+            connection.close()
+
+    def flush(self):
+        with self.lock:
+            hits, self.hits = self.hits, Counter()
+        for (query_string, date), count in hits.items():
+            try:
+                with transaction.atomic():
+                    record_hits(query_string, date, count)
+            except (InterfaceError, OperationalError) as e:
+                print(e)
+                # The database is unavailable, they're kept for the next flush
+                with self.lock:
+                    self.hits[(query_string, date)] += count
+            except Exception as e:
+                # Retrying wouldn't fix it (eg: invalid data)
+                print(e)
+
+
+hit_buffer = HitBuffer()
+
+# Write the pending hits when the process exits
+atexit.register(hit_buffer.flush)
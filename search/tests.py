@@ -0,0 +1,59 @@
+from unittest import mock, skipUnless
+
+from django.db import connection, DataError, OperationalError
+from django.test import TestCase
+from django.utils.timezone import now
+from wagtail.search.models import Query, QueryDailyHits
+
+from search.hits import HitBuffer
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Hits are upserted with PostgreSQL ON CONFLICT')
+class HitBufferTest(TestCase):
+    def setUp(self):
+        self.buffer = HitBuffer()
+        # Flushed by hand, without the background thread
+        self.buffer.thread = mock.Mock(is_alive=lambda: True)
+
+    def get_hits(self, query_string):
+        return QueryDailyHits.objects.get(query=Query.get(query_string), date=now().date()).hits
+
+    def test_flush_aggregates_hits(self):
+        self.buffer.add('Becas')
+        self.buffer.add('becas ')
+        self.buffer.add('fech')
+        self.buffer.flush()
+        self.assertEqual(self.get_hits('becas'), 2)
+        self.assertEqual(self.get_hits('fech'), 1)
+        self.assertFalse(self.buffer.hits)
+
+    def test_flush_upserts_existing_hits(self):
+        self.buffer.add('becas')
+        self.buffer.flush()
+        self.buffer.add('becas')
+        self.buffer.add('becas')
+        self.buffer.flush()
+        self.assertEqual(self.get_hits('becas'), 3)
+
+    def test_failed_hits_are_retried(self):
+        self.buffer.add('becas')
+        with mock.patch('search.hits.record_hits', side_effect=OperationalError('unavailable')):
+            self.buffer.flush()
+        self.assertEqual(sum(self.buffer.hits.values()), 1)
+        self.buffer.add('becas')
+        self.buffer.flush()
+        self.assertEqual(self.get_hits('becas'), 2)
+        self.assertFalse(self.buffer.hits)
+
+    def test_invalid_hits_are_dropped(self):
+        self.buffer.add('becas')
+        with mock.patch('search.hits.record_hits', side_effect=DataError('invalid')):
+            self.buffer.flush()
+        self.assertFalse(self.buffer.hits)
+
+    def test_long_queries_are_truncated(self):
+        self.buffer.add('becas ' * 100)
+        self.buffer.flush()
+        hits = QueryDailyHits.objects.select_related('query').get()
+        self.assertEqual(hits.hits, 1)
+        self.assertLessEqual(len(hits.query.query_string), 255)
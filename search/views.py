@@ -2,7 +2,8 @@ from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.shortcuts import render
 
 from wagtail.core.models import Page
-from wagtail.search.models import Query
+
+from search.hits import hit_buffer
 
 
 def search(request):
@@ -12,10 +13,9 @@ def search(request):
     # Search
     if search_query:
         search_results = Page.objects.live().search(search_query)
-        query = Query.get(search_query)
 
-        # Record hit
-        query.add_hit()
+        # Record hit, written in the background
+        hit_buffer.add(search_query)
     else:
         search_results = Page.objects.none()
 
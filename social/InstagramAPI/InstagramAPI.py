@@ -37,6 +37,8 @@ except:
     from .ImageUtils import getImageSize
 
 from .exceptions import SentryBlockException
+from .retry import RetryPolicy
+from .streams import FileChunk
 
 
 class InstagramAPI:
@@ -61,7 +63,11 @@ class InstagramAPI:
     # rank_token          # Rank token
     # IGDataPath          # Data storage path
 
-    def __init__(self, username, password, debug=False, IGDataPath=None):
+    # Hosts that get their own connection pool in keep-alive mode
+    POOLED_HOSTS = ['https://i.instagram.com/', 'https://upload.instagram.com/']
+
+    def __init__(self, username, password, debug=False, IGDataPath=None, retry_policy=None, timeout=30,
+                 keep_alive=True, pool_maxsize=4):
         m = hashlib.md5()
         m.update(username.encode('utf-8') + password.encode('utf-8'))
         self.device_id = self.generateDeviceId(m.hexdigest())
@@ -69,12 +75,67 @@ class InstagramAPI:
         self.isLoggedIn = False
         self.LastResponse = None
         self.s = requests.Session()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        if keep_alive:
+            self.mountPooledAdapters(self.POOLED_HOSTS, pool_maxsize)
+
+    def mountPooledAdapters(self, hosts, pool_maxsize=4):
+        """
+        Mounts a keep-alive connection pool per host, so consecutive requests reuse the TCP/TLS connection
+        """
+        for host in hosts:
+            self.s.mount(host, requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize))
+
+    def getConnectionHeader(self):
+        return 'keep-alive' if self.keep_alive else 'close'
 
     def setUser(self, username, password):
         self.username = username
         self.password = password
         self.uuid = self.generateUUID(True)
 
+    def getSessionData(self):
+        """
+        Returns the data needed to restore the logged in session in another process
+        """
+        return {'username': self.username,
+                'uuid': self.uuid,
+                'device_id': self.device_id,
+                'username_id': self.username_id,
+                'rank_token': self.rank_token,
+                'token': self.token,
+                'cookies': requests.utils.dict_from_cookiejar(self.s.cookies)}
+
+    def setSessionData(self, data):
+        """
+        Restores a session returned by getSessionData, without login requests
+        """
+        if data.get('username') != self.username:
+            return False
+        self.uuid = data['uuid']
+        self.device_id = data['device_id']
+        self.username_id = data['username_id']
+        self.rank_token = data['rank_token']
+        self.token = data['token']
+        self.s.cookies = requests.utils.cookiejar_from_dict(data['cookies'])
+        self.isLoggedIn = True
+        return True
+
+    def isLoginRequired(self):
+        """
+        Tells if the last request failed because the session is not valid anymore
+        """
+        if self.LastResponse is None:
+            return False
+        if self.LastResponse.status_code in (401, 403):
+            return True
+        try:
+            return self.LastResponse.json().get('message') in ('login_required', 'checkpoint_required')
+        except ValueError:
+            return False
+
     def setProxy(self, proxy=None):
         """
         Set proxy for all requests::
@@ -144,26 +205,33 @@ class InstagramAPI:
     def uploadPhoto(self, photo, caption=None, upload_id=None, is_sidecar=None):
         if upload_id is None:
             upload_id = str(int(time.time() * 1000))
-        data = {'upload_id': upload_id,
-                '_uuid': self.uuid,
-                '_csrftoken': self.token,
-                'image_compression': '{"lib_name":"jt","lib_version":"1.3.0","quality":"87"}',
-                'photo': ('pending_media_%s.jpg' % upload_id, open(photo, 'rb'), 'application/octet-stream', {'Content-Transfer-Encoding': 'binary'})}
-        if is_sidecar:
-            data['is_sidecar'] = '1'
-        m = MultipartEncoder(data, boundary=self.uuid)
+        def encoder():
+            # The encoder streams the photo from disk, a new one is needed for each attempt
+            data = {'upload_id': upload_id,
+                    '_uuid': self.uuid,
+                    '_csrftoken': self.token,
+                    'image_compression': '{"lib_name":"jt","lib_version":"1.3.0","quality":"87"}',
+                    'photo': ('pending_media_%s.jpg' % upload_id, FileChunk(photo), 'application/octet-stream', {'Content-Transfer-Encoding': 'binary'})}
+            if is_sidecar:
+                data['is_sidecar'] = '1'
+            return MultipartEncoder(data, boundary=self.uuid)
+
         self.s.headers.update({'X-IG-Capabilities': '3Q4=',
                                'X-IG-Connection-Type': 'WIFI',
                                'Cookie2': '$Version=1',
                                'Accept-Language': 'en-US',
                                'Accept-Encoding': 'gzip, deflate',
-                               'Content-type': m.content_type,
-                               'Connection': 'close',
+                               'Content-type': encoder().content_type,
+                               'Connection': self.getConnectionHeader(),
                                'User-Agent': self.USER_AGENT})
-        response = self.s.post(self.API_URL + "upload/photo/", data=m.to_string())
+        url = self.API_URL + "upload/photo/"
+        response = self.retry_policy.call(lambda: self.s.post(url, data=encoder(), timeout=self.timeout), url)
         if response.status_code == 200:
             if self.configure(upload_id, photo, caption):
                 self.expose()
+                return True
+        else:
+            self.LastResponse = response
         return False
 
     def uploadVideo(self, video, thumbnail, caption=None, upload_id=None, is_sidecar=None):
@@ -185,16 +253,19 @@ class InstagramAPI:
                                'Content-type': m.content_type,
                                'Connection': 'keep-alive',
                                'User-Agent': self.USER_AGENT})
-        response = self.s.post(self.API_URL + "upload/video/", data=m.to_string())
+        body = m.to_string()
+        url = self.API_URL + "upload/video/"
+        response = self.retry_policy.call(lambda: self.s.post(url, data=body, timeout=self.timeout), url)
         if response.status_code == 200:
             body = json.loads(response.text)
             upload_url = body['video_upload_urls'][3]['url']
             upload_job = body['video_upload_urls'][3]['job']
 
-            videoData = open(video, 'rb').read()
+            # The video is sent in four pieces streamed from disk
+            videoSize = os.path.getsize(video)
             # solve issue #85 TypeError: slice indices must be integers or None or have an __index__ method
-            request_size = int(math.floor(len(videoData) / 4))
-            lastRequestExtra = (len(videoData) - (request_size * 3))
+            request_size = int(math.floor(videoSize / 4))
+            lastRequestExtra = (videoSize - (request_size * 3))
 
             headers = copy.deepcopy(self.s.headers)
             self.s.headers.update({'X-IG-Capabilities': '3Q4=',
@@ -217,10 +288,12 @@ class InstagramAPI:
                     end = (i + 1) * request_size
                 length = lastRequestExtra if i == 3 else request_size
                 content_range = "bytes {start}-{end}/{lenVideo}".format(start=start, end=(end - 1),
-                                                                        lenVideo=len(videoData)).encode('utf-8')
+                                                                        lenVideo=videoSize).encode('utf-8')
 
                 self.s.headers.update({'Content-Length': str(end - start), 'Content-Range': content_range, })
-                response = self.s.post(upload_url, data=videoData[start:start + length])
+                response = self.retry_policy.call(
+                    lambda: self.s.post(upload_url, data=FileChunk(video, start, length), timeout=self.timeout),
+                    upload_url)
             self.s.headers = headers
 
             if response.status_code == 200:
@@ -952,23 +1025,21 @@ class InstagramAPI:
         if (not self.isLoggedIn and not login):
             raise Exception("Not logged in!\n")
 
-        self.s.headers.update({'Connection': 'close',
+        self.s.headers.update({'Connection': self.getConnectionHeader(),
                                'Accept': '*/*',
                                'Content-type': 'application/x-www-form-urlencoded; charset=UTF-8',
                                'Cookie2': '$Version=1',
                                'Accept-Language': 'en-US',
                                'User-Agent': self.USER_AGENT})
 
-        while True:
-            try:
-                if (post is not None):
-                    response = self.s.post(self.API_URL + endpoint, data=post, verify=verify)
-                else:
-                    response = self.s.get(self.API_URL + endpoint, verify=verify)
-                break
-            except Exception as e:
-                print('Except on SendRequest (wait 60 sec and resend): ' + str(e))
-                time.sleep(60)
+        url = self.API_URL + endpoint
+        if (post is not None):
+            # POSTs may create or change things (eg: media/configure/ creates the post), so they aren't
+            # retried once they may have reached the server
+            response = self.retry_policy.call(lambda: self.s.post(url, data=post, verify=verify, timeout=self.timeout),
+                                              url, idempotent=False)
+        else:
+            response = self.retry_policy.call(lambda: self.s.get(url, verify=verify, timeout=self.timeout), url)
 
         if response.status_code == 200:
             self.LastResponse = response
@@ -1,2 +1,14 @@
 class SentryBlockException(Exception):
     pass
+
+
+class RequestFailedException(Exception):
+    """
+    Raised when a request keeps failing after the retries allowed by the RetryPolicy
+    """
+    def __init__(self, message, url=None, status_code=None, attempts=0, retryable=False):
+        super().__init__(message)
+        self.url = url
+        self.status_code = status_code
+        self.attempts = attempts
+        self.retryable = retryable
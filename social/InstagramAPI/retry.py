@@ -0,0 +1,92 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from .exceptions import RequestFailedException
+
+
+class RetryPolicy:
+    """
+    Retries failed requests with exponential backoff and jitter, honoring Retry-After.
+    Connection errors and retryable statuses are retried until max_attempts or the deadline (seconds
+    since the first attempt) is reached, so a failing endpoint can't block the caller indefinitely.
+    """
+    RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+    """
+    Statuses of requests that aren't idempotent retried when the server asks to (with Retry-After), as it
+    didn't process them
+    """
+    THROTTLED_STATUSES = (429, 503)
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0, deadline=90.0, retryable_statuses=None,
+                 sleep=time.sleep):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retryable_statuses = retryable_statuses or self.RETRYABLE_STATUSES
+        self.sleep = sleep
+
+    def is_retryable(self, response, idempotent=True):
+        if not idempotent:
+            return response.status_code in self.THROTTLED_STATUSES and self.get_retry_after(response) is not None
+        return response.status_code in self.retryable_statuses
+
+    def is_retryable_error(self, error, idempotent=True):
+        # Only a connect timeout guarantees the request wasn't sent
+        return idempotent or isinstance(error, requests.ConnectTimeout)
+
+    def get_retry_after(self, response):
+        value = response.headers.get('Retry-After') if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def get_delay(self, attempt, response=None):
+        retry_after = self.get_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, request, url=None, idempotent=True):
+        """
+        Calls request() (which returns a requests.Response) until it succeeds or isn't retryable.
+        Requests that aren't idempotent (eg: creating a post) are only retried when they weren't sent or processed.
+        Returns the last response, or raises RequestFailedException when no response was obtained
+        """
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            response = None
+            try:
+                response = request()
+                if not self.is_retryable(response, idempotent):
+                    return response
+                error = 'Request returned %d' % response.status_code
+            except requests.RequestException as e:
+                if not self.is_retryable_error(e, idempotent):
+                    # The caller may still retry it if it knows the request had no effect
+                    raise RequestFailedException('Request to %s failed: %s' % (url, e), url=url, attempts=attempt,
+                                                 retryable=True)
+                error = str(e)
+
+            delay = self.get_delay(attempt, response)
+            if attempt >= self.max_attempts or time.monotonic() - start + delay > self.deadline:
+                if response is not None:
+                    return response
+                raise RequestFailedException('Request to %s failed after %d attempts: %s' % (url, attempt, error),
+                                             url=url, attempts=attempt, retryable=True)
+            print('Request to %s failed (%s), retrying in %.1f sec' % (url, error, delay))
+            self.sleep(delay)
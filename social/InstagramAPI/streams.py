@@ -0,0 +1,34 @@
+import os
+
+
+class FileChunk:
+    """
+    Read-only window of length bytes of a file, starting at offset. Passed as a request body it's sent
+    in small blocks straight from disk, so uploads don't need the file in memory.
+    """
+    def __init__(self, path, offset=0, length=None):
+        self.path = path
+        self.offset = offset
+        self.length = os.path.getsize(path) - offset if length is None else length
+        self.remaining = self.length
+        self.file = None
+
+    def __len__(self):
+        return self.remaining
+
+    def read(self, size=-1):
+        if self.file is None:
+            self.file = open(self.path, 'rb')
+            self.file.seek(self.offset)
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        if not self.remaining:
+            self.close()
+        return data
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class SocialConfig(AppConfig):
     name = 'social'
+
+    def ready(self):
+        from social.renditions import connect_signals
+        connect_signals()
@@ -1,16 +1,63 @@
-import twitter
+import json
+import os
 
-from fech.settings.base import INSTAGRAM_USER, INSTAGRAM_PWD, TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET, TWITTER_TOKEN_KEY, TWITTER_TOKEN_SECRET
+from fech.settings.base import INSTAGRAM_USER, INSTAGRAM_PWD, INSTAGRAM_SESSION_FILE, INSTAGRAM_RETRY, \
+    INSTAGRAM_TIMEOUT, INSTAGRAM_KEEP_ALIVE, INSTAGRAM_POOL_MAXSIZE, TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET, TWITTER_TOKEN_KEY, TWITTER_TOKEN_SECRET
 
-from social.InstagramAPI import InstagramAPI
 
+"""
+Logged in Instagram client of this process
+"""
+_instagram_api = None
 
+
+def load_instagram_session(api):
+    try:
+        with open(INSTAGRAM_SESSION_FILE) as file:
+            return api.setSessionData(json.load(file))
+    except (IOError, ValueError, KeyError):
+        return False
+
+
+def save_instagram_session(api):
+    fd = os.open(INSTAGRAM_SESSION_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as file:
+        json.dump(api.getSessionData(), file)
+
+
+def login_instagram_api(api):
+    """
+    Logs in again (eg: when the stored session expired) and stores the new session.
+    """
+    if api.login(force=True):
+        save_instagram_session(api)
+        return True
+    return False
+
+
+# The API clients are imported when used, so processes that don't publish (eg: cron ticks with
+# nothing due) don't load them
 def get_instagram_api():
-    return InstagramAPI(INSTAGRAM_USER, INSTAGRAM_PWD)
+    """
+    Returns a logged in client. The session is stored in INSTAGRAM_SESSION_FILE and reused across
+    processes, so the client only logs in when there is no stored session or it stopped being valid.
+    """
+    global _instagram_api
+    if _instagram_api is None:
+        from social.InstagramAPI import InstagramAPI
+        from social.InstagramAPI.retry import RetryPolicy
+        api = InstagramAPI(INSTAGRAM_USER, INSTAGRAM_PWD, retry_policy=RetryPolicy(**INSTAGRAM_RETRY),
+                           timeout=INSTAGRAM_TIMEOUT, keep_alive=INSTAGRAM_KEEP_ALIVE,
+                           pool_maxsize=INSTAGRAM_POOL_MAXSIZE)
+        if not load_instagram_session(api):
+            login_instagram_api(api)
+        _instagram_api = api
+    return _instagram_api
 
 
 def get_twitter_api():
+    import twitter
     return twitter.Api(consumer_key=TWITTER_CONSUMER_KEY,
                       consumer_secret=TWITTER_CONSUMER_SECRET,
                       access_token_key=TWITTER_TOKEN_KEY,
-                      access_token_secret=TWITTER_TOKEN_SECRET)
\ No newline at end of file
+                      access_token_secret=TWITTER_TOKEN_SECRET)
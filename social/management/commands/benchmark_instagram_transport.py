@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from django.core.management import BaseCommand
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request like a successful Instagram API call
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        body = json.dumps({'status': 'ok'}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = respond
+    do_POST = respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """
+    Counts the accepted connections, each one would be a TCP and TLS handshake with Instagram
+    """
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def get_request(self):
+        request = super().get_request()
+        with self.lock:
+            self.connections += 1
+        return request
+
+
+class Command(BaseCommand):
+    help = 'Compares the connections opened by InstagramAPI with and without keep-alive against a local stub server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests',
+                            type=int,
+                            dest='requests',
+                            default=50,
+                            help='Number of API requests per mode')
+
+    def run(self, server, keep_alive, requests):
+        from social.InstagramAPI import InstagramAPI
+
+        base_url = 'http://%s:%d/' % server.server_address
+        api = InstagramAPI('benchmark', 'benchmark', keep_alive=keep_alive)
+        api.API_URL = base_url + 'api/v1/'
+        if keep_alive:
+            api.mountPooledAdapters([base_url])
+        api.isLoggedIn = True
+
+        server.connections = 0
+        start = time.time()
+        for i in range(requests):
+            api.SendRequest('feed/timeline/')
+        return server.connections, time.time() - start
+
+    def handle(self, *args, **options):
+        server = StubServer(('127.0.0.1', 0), StubHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            for keep_alive in (False, True):
+                connections, elapsed = self.run(server, keep_alive, options['requests'])
+                self.stdout.write('%s: %d requests, %d connections (handshakes), %.3fs' % (
+                    'keep-alive' if keep_alive else 'Connection: close', options['requests'], connections, elapsed))
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from fech.settings.base import SOCIAL_MEDIA_CACHE_DIR, SOCIAL_MEDIA_CACHE_SIZE
+
+
+"""
+Target format of the media posted to the social networks: image format, max (width, height) and quality
+"""
+JPEG_PROFILE = {
+    'format': 'JPEG',
+    'max_size': None,
+    'quality': 90,
+}
+
+"""
+Hashes of the source files of this process: path -> (mtime, size, hash)
+"""
+_file_hashes = {}
+
+
+def get_file_hash(path):
+    stat = os.stat(path)
+    cached = _file_hashes.get(path)
+    if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(64 * 1024), b''):
+            digest.update(block)
+    _file_hashes[path] = (stat.st_mtime, stat.st_size, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def get_cache_path(path, profile):
+    profile_key = json.dumps(profile, sort_keys=True)
+    key = hashlib.sha256(('%s:%s' % (get_file_hash(path), profile_key)).encode('utf-8')).hexdigest()
+    return os.path.join(SOCIAL_MEDIA_CACHE_DIR, '%s.%s' % (key, profile['format'].lower()))
+
+
+def matches_profile(path, profile):
+    """
+    Tells if the image at path is already in the format and size of the profile. Only its header is read.
+    """
+    from PIL import Image
+
+    with Image.open(path) as image:
+        max_size = profile['max_size']
+        fits = not max_size or (image.width <= max_size[0] and image.height <= max_size[1])
+        return image.format == profile['format'] and image.mode == 'RGB' and fits
+
+
+def convert_image(path, target, profile):
+    """
+    Writes the image at path to target in the format of the profile.
+    """
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image = image.convert('RGB')
+        if profile['max_size']:
+            image.thumbnail(profile['max_size'], Image.LANCZOS)
+        image.save(target, profile['format'], quality=profile['quality'])
+
+
+def evict(keep=None):
+    """
+    Removes the least recently used files until the cache fits in SOCIAL_MEDIA_CACHE_SIZE bytes.
+    """
+    entries = []
+    for entry in os.scandir(SOCIAL_MEDIA_CACHE_DIR):
+        if entry.is_file() and entry.path != keep:
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for mtime, size, path in entries)
+    if keep:
+        total += os.path.getsize(keep)
+    for mtime, size, path in sorted(entries):
+        if total <= SOCIAL_MEDIA_CACHE_SIZE:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def prepare_media(path, profile=JPEG_PROFILE):
+    """
+    Returns the path of the image at path converted to the profile. Conversions are cached by source
+    content and profile, so an image shared to several networks or again later is converted once.
+    Images already in the format of the profile (eg: Wagtail renditions) are used as they are.
+    """
+    if matches_profile(path, profile):
+        return path
+
+    cache_path = get_cache_path(path, profile)
+    if os.path.exists(cache_path):
+        # Mark it as recently used
+        os.utime(cache_path)
+        return cache_path
+
+    os.makedirs(SOCIAL_MEDIA_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=SOCIAL_MEDIA_CACHE_DIR, suffix='.tmp')
+    os.close(fd)
+    try:
+        convert_image(path, tmp_path, profile)
+        # Concurrent publishers may convert the same image, the rename keeps the cached file complete
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    evict(keep=cache_path)
+    return cache_path
@@ -1,9 +1,8 @@
 import os
 import io
 
-from PIL import Image
-
-from social.credentials import get_instagram_api, get_twitter_api
+from social.credentials import get_instagram_api, get_twitter_api, login_instagram_api
+from social.media import prepare_media, JPEG_PROFILE
 
 
 def get_path(file):
@@ -17,40 +16,71 @@ def convert_filename_to_jpg(file):
 
 
 def convert_to_jpg(file):
-    file = get_path(file)
-    file_name, file_extension = os.path.splitext(file)
-    if file_extension.lower() != 'jpg':
-        im = Image.open(file)
-        rgb_im = im.convert('RGB')
-        file = '%s.jpg' % file_name
-        rgb_im.save(file)
-        return file
-    return file
+    """
+    Returns a JPEG version of the file, from the social media cache.
+    """
+    return prepare_media(get_path(file), JPEG_PROFILE)
 
 
-def remove_jpg_cache(file):
-    file_name, file_extension = os.path.splitext(get_path(file))
-    if file_extension.lower() != 'jpg':
-        os.remove('%s.jpg' % file_name, dir_fd=None)
+class PostNotSentException(Exception):
+    """
+    Raised when a post failed before the request that creates it was sent, so retrying it can't
+    publish it twice.
+    """
+    def __init__(self, message, status_code=None, retryable=True):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
 
 
-def publish_img_to_instagram(description='', media=None):
+"""
+Instagram endpoint that creates the post, once it was sent the post may exist
+"""
+INSTAGRAM_CONFIGURE_ENDPOINT = 'media/configure/'
 
-    api = get_instagram_api()
-    api.login()  # login
 
-    photo_path = media
-    api.uploadPhoto(convert_to_jpg(media), caption=description)
+def publish_img_to_instagram(description='', media=None):
 
-    remove_jpg_cache(photo_path)
+    from social.InstagramAPI.exceptions import RequestFailedException
+
+    try:
+        api = get_instagram_api()
+        photo = convert_to_jpg(media)
+    except Exception as e:
+        raise PostNotSentException(str(e)) from e
+
+    def upload():
+        try:
+            return api.uploadPhoto(photo, caption=description)
+        except RequestFailedException as e:
+            if e.url is not None and INSTAGRAM_CONFIGURE_ENDPOINT in e.url:
+                raise
+            raise PostNotSentException(str(e), status_code=e.status_code, retryable=e.retryable) from e
+
+    uploaded = upload()
+    if not uploaded and api.isLoginRequired():
+        # The stored session expired, login once and retry
+        if login_instagram_api(api):
+            uploaded = upload()
+
+    if not uploaded:
+        response = api.LastResponse
+        status_code = response.status_code if response is not None else None
+        url = response.url if response is not None else None
+        message = 'Instagram upload failed (status %s)' % status_code
+        retryable = status_code is None or status_code in api.retry_policy.retryable_statuses
+        if url is not None and INSTAGRAM_CONFIGURE_ENDPOINT in url:
+            raise RequestFailedException(message, url=url, status_code=status_code, retryable=retryable)
+        raise PostNotSentException(message, status_code=status_code, retryable=retryable)
+    return True
 
 
 def publish_img_to_twitter(description='', media=None):
 
-    api = get_twitter_api()
-    photo_path = media
-    media = convert_to_jpg(media)
-    caption = description
-    api.PostUpdate(caption, media=media)
-
-    remove_jpg_cache(photo_path)
\ No newline at end of file
+    try:
+        api = get_twitter_api()
+        # The media is uploaded first, so only the status update can create the post
+        media_id = api.UploadMediaChunked(convert_to_jpg(media))
+    except Exception as e:
+        raise PostNotSentException(str(e), status_code=getattr(e, 'status_code', None)) from e
+    api.PostUpdate(description, media=media_id)
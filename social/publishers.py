@@ -1,17 +1,28 @@
 
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+
+from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
+from django.db.models import F, Case, When, Value, DateTimeField
 from django.template.loader import get_template
 from django.utils.timezone import now
 
 from django.core import mail
 from sentry_sdk import capture_exception
 
-from social.publish import publish_img_to_twitter, publish_img_to_instagram
+from notifications.models import DeliveryMixin
+from notifications.notifiers import BaseNotificationProvider
+from social.publish import publish_img_to_twitter, publish_img_to_instagram, PostNotSentException
+from social.renditions import get_sharing_media
 
 """
 Given a query set, it obtains a filtered publication list
 """
-class BasePublicationProvider:
+class BasePublicationProvider(BaseNotificationProvider):
     """
     Specifies when the notification should be send (Datetime)
     """
@@ -27,25 +38,165 @@ class BasePublicationProvider:
     """
     channel_field = 'channel'
 
-    def __init__(self, notifications):
-        self.notifications = notifications
-
-    '''
-    Get notifications that need to be send through the specified channel
-    '''
-    def get_notifications(self, channel):
-        filters = {
-            '{0}__{1}'.format(self.notify_at_field, 'lte'): now(),
-            '{0}'.format(self.notified_field): False,
-            '{0}'.format(self.channel_field): channel
-        }
-        return self.notifications.filter(**filters)
+    def get_done_values(self):
+        values = super().get_done_values()
+        values['published_at'] = now()
+        return values
+
+    def mark_published(self, published_at):
+        """
+        Marks the publications as done with the time each one was posted ({pk: datetime}), in a single update.
+        """
+        values = self.get_done_values()
+        values['published_at'] = Case(*[When(pk=pk, then=Value(dt)) for pk, dt in published_at.items()],
+                                      output_field=DateTimeField())
+        self.get_claimed(list(published_at), DeliveryMixin.STATUS_POSTING).update(**values)
+
+    def get_failed_values(self):
+        values = super().get_failed_values()
+        values['failures'] = F('failures') + 1
+        return values
+
+    def get_retried_values(self):
+        values = self.get_released_values()
+        values['failures'] = F('failures') + 1
+        return values
+
+    def retry(self, pks):
+        """
+        Returns publications whose post was attempted but didn't go through to pending, counting the attempt.
+        """
+        self.get_claimed(pks, DeliveryMixin.STATUS_POSTING).update(**self.get_retried_values())
+
+
+class RateLimiter:
+    """
+    Spaces the calls to wait of several threads so there are at most rate per minute (no limit when rate is 0).
+    """
+    def __init__(self, rate):
+        self.interval = 60.0 / rate if rate else 0
+        self.next_at = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            current = time.monotonic()
+            start = max(current, self.next_at)
+            self.next_at = start + self.interval
+        if start > current:
+            time.sleep(start - current)
+
+
+class ChannelRunner:
+    """
+    Posts the due publications of several publishers of the same channel (eg: one per content model).
+    Posts run in up to max_workers threads and at most rate per minute, while rows are claimed, read and
+    marked in the calling thread, so a row is never posted twice.
+    """
+    def __init__(self, publishers):
+        self.publishers = publishers
+        self.max_workers = min(publisher.max_workers for publisher in publishers)
+        self.limiter = RateLimiter(min(publisher.rate for publisher in publishers))
+        # Rows are marked as posting in batches of this size
+        self.start_size = max(self.max_workers, min(publisher.flush_size for publisher in publishers))
+
+    def send(self, publisher, data):
+        self.limiter.wait()
+        return publisher.send_post(**data)
+
+    def get_posts(self):
+        """
+        Yields the claimed publications to post with the arguments of their post.
+        """
+        for publisher in self.publishers:
+            for publication in publisher.notifications:
+                try:
+                    data = publisher.get_post_data(publication)
+                except Exception as e:
+                    publisher.add_failure(publication, e)
+                    publisher.mark_unclaimed(publication)
+                    continue
+                yield publisher, publication, data
+
+    def start(self, posts):
+        """
+        Marks a batch of posts as posting, with one update per publisher. Returns the posts that can be posted.
+        """
+        started = {}
+        for publisher in self.publishers:
+            pks = [publication.pk for post_publisher, publication, data in posts if post_publisher is publisher]
+            if pks:
+                started[publisher] = set(publisher.provider.start(pks))
+        return [post for post in posts if post[1].pk in started[post[0]]]
+
+    def run(self):
+        posts = self.get_posts()
+        started = deque()
+        exhausted = False
+        pending = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while True:
+                    while not started and not exhausted:
+                        batch = list(islice(posts, self.start_size))
+                        exhausted = len(batch) < self.start_size
+                        started.extend(self.start(batch))
+                    while started and len(pending) < self.max_workers:
+                        publisher, publication, data = started.popleft()
+                        pending[executor.submit(self.send, publisher, data)] = (publisher, publication)
+                    if not pending:
+                        break
+                    done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        publisher, publication = pending.pop(future)
+                        self.finish(publisher, publication, future)
+        finally:
+            # Started rows that weren't submitted were never posted
+            for publisher, publication, data in started:
+                publisher.mark_unstarted(publication)
+            for publisher in self.publishers:
+                publisher.flush()
+
+        for publisher in self.publishers:
+            publisher.report()
+
+    def finish(self, publisher, publication, future):
+        try:
+            posted = future.result()
+        except PostNotSentException as e:
+            publisher.add_failure(publication, e)
+            if e.retryable:
+                publisher.mark_unposted(publication)
+            else:
+                publisher.mark_failed(publication)
+            return
+        except Exception as e:
+            # The post may have reached the network, it's not retried
+            publisher.add_failure(publication, e)
+            publisher.mark_failed(publication)
+            return
+        if posted:
+            publisher.mark_published(publication)
+        else:
+            publisher.mark_unposted(publication)
 
 
 class BasePublisher:
     channel = None
     object_field = None
 
+    """
+    Max number of concurrent posts and max posts per minute through the channel
+    """
+    max_workers = 1
+    rate = 0
+
+    """
+    Number of results kept before writing them to the database, with one update per kind of result
+    (published, failed, unposted and unstarted)
+    """
+    flush_size = getattr(settings, 'SOCIAL_PUBLISHING_FLUSH_SIZE', 20)
+
     object_notification_mapping = {
         'description': 'title',
         'media': 'image_path',
@@ -53,25 +204,109 @@ class BasePublisher:
 
     def __init__(self, provider, object_field):
         self.provider = provider
-        self.notifications = self.provider.get_notifications(self.channel)
+        self.notifications = self.provider.claim_notifications(self.channel)
         self.object_field = object_field
+        self.failures = []
+        self.published_at = {}
+        self.failed_ids = []
+        self.unposted_ids = []
+        self.unstarted_ids = []
 
     def post_publications(self):
-        for publication in self.notifications:
-            posted = False
-            try:
-                posted = self.post(publication)
-            except Exception as e:
-                print(e)
-                capture_exception(e)
-            if posted:
-                setattr(publication, self.provider.notified_field, True)
-                publication.save()
+        ChannelRunner([self]).run()
+
+    def mark_published(self, publication):
+        # Posts are written in batches, the time of each one is kept until then
+        self.published_at[publication.pk] = now()
+        self.flush_if_full()
+
+    def mark_failed(self, publication):
+        self.failed_ids.append(publication.pk)
+        self.flush_if_full()
+
+    def mark_unposted(self, publication):
+        """
+        The publication wasn't posted, it's retried in a later run and counted as a failure.
+        """
+        self.unposted_ids.append(publication.pk)
+        self.flush_if_full()
+
+    def mark_unstarted(self, publication):
+        """
+        The publication was marked as posting but never posted, it's retried in a later run.
+        """
+        self.unstarted_ids.append(publication.pk)
+        self.flush_if_full()
+
+    def mark_unclaimed(self, publication):
+        """
+        The publication couldn't be prepared, so it never started posting.
+        """
+        self.provider.release([publication.pk], DeliveryMixin.STATUS_CLAIMED)
+
+    def flush_if_full(self):
+        if len(self.published_at) + len(self.failed_ids) + len(self.unposted_ids) + len(self.unstarted_ids) \
+                >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the results of the publications. Until then they stay as posting, which is never posted again.
+        """
+        if self.published_at:
+            self.provider.mark_published(self.published_at)
+        if self.failed_ids:
+            self.provider.mark_failed(self.failed_ids)
+        if self.unposted_ids:
+            self.provider.retry(self.unposted_ids)
+        if self.unstarted_ids:
+            self.provider.release(self.unstarted_ids)
+        self.published_at = {}
+        self.failed_ids = []
+        self.unposted_ids = []
+        self.unstarted_ids = []
+
+    def add_failure(self, publication, error):
+        print(error)
+        capture_exception(error)
+        self.failures.append(self.build_failure(publication, error))
+
+    def report(self):
+        if self.failures:
+            print('%d publications failed through %s: %s' % (len(self.failures), self.channel, self.failures))
         self.after_post()
 
-    def post(self, notification):
+    def build_failure(self, publication, error):
+        """
+        Describes a failed publication. Errors raised by the API clients may tell if it's worth retrying.
+        """
+        return {
+            'id': publication.pk,
+            'channel': self.channel,
+            'error': str(error),
+            'status_code': getattr(error, 'status_code', None),
+            'retryable': getattr(error, 'retryable', True),
+        }
+
+    def get_post_data(self, publication):
+        """
+        Arguments of send_post for the publication. Reads the database, so it runs before the post is queued.
+        """
+        object_data = self.get_object(publication)
+        return {
+            'description': self.get_publication_attr(object_data, 'description'),
+            'media': get_sharing_media(publication, object_data),
+        }
+
+    def send_post(self, description=None, media=None):
+        """
+        Posts to the social network, it runs in a worker thread and must not use the database.
+        """
         pass
 
+    def post(self, publication):
+        return self.send_post(**self.get_post_data(publication))
+
     def after_post(self):
         pass
 
@@ -85,11 +320,10 @@ class BasePublisher:
 class TwitterPublisher(BasePublisher):
 
     channel = 'TWITTER'
+    max_workers = getattr(settings, 'SOCIAL_PUBLISHING_WORKERS', {}).get(channel, 1)
+    rate = getattr(settings, 'SOCIAL_PUBLISHING_RATE', {}).get(channel, 0)
 
-    def post(self, publication):
-        object_data = self.get_object(publication)
-        description = self.get_publication_attr(object_data, 'description')
-        media = self.get_publication_attr(object_data, 'media')
+    def send_post(self, description=None, media=None):
         publish_img_to_twitter(description=description, media=media)
         return True
 
@@ -97,10 +331,8 @@ class TwitterPublisher(BasePublisher):
 class InstagramPublisher(BasePublisher):
 
     channel = 'INSTAGRAM'
+    max_workers = getattr(settings, 'SOCIAL_PUBLISHING_WORKERS', {}).get(channel, 1)
+    rate = getattr(settings, 'SOCIAL_PUBLISHING_RATE', {}).get(channel, 0)
 
-    def post(self, publication):
-        object_data = self.get_object(publication)
-        description = self.get_publication_attr(object_data, 'description')
-        media = self.get_publication_attr(object_data, 'media')
-        publish_img_to_instagram(description=description, media=media)
-        return True
+    def send_post(self, description=None, media=None):
+        return publish_img_to_instagram(description=description, media=media)
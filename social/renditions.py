@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from sentry_sdk import capture_exception
+
+from blog.models import Sharing
+
+
+"""
+Instagram accepts aspect ratios between 4:5 and 1.91:1, images are cropped to the nearest one and
+scaled down to 1080px wide
+"""
+INSTAGRAM_MIN_RATIO = 4 / 5
+INSTAGRAM_MAX_RATIO = 1.91
+INSTAGRAM_WIDTH = 1080
+
+"""
+Twitter accepts images up to 4096x4096 and 5MB, the quality is lowered until the image fits
+"""
+TWITTER_MAX_SIZE = 4096
+TWITTER_MAX_BYTES = 5 * 1024 * 1024
+TWITTER_QUALITIES = [85, 70, 55]
+
+
+def get_instagram_filter(image):
+    ratio = image.width / image.height
+    if ratio < INSTAGRAM_MIN_RATIO:
+        resize = 'fill-%dx%d' % (INSTAGRAM_WIDTH, round(INSTAGRAM_WIDTH / INSTAGRAM_MIN_RATIO))
+    elif ratio > INSTAGRAM_MAX_RATIO:
+        resize = 'fill-%dx%d' % (INSTAGRAM_WIDTH, round(INSTAGRAM_WIDTH / INSTAGRAM_MAX_RATIO))
+    else:
+        resize = 'width-%d' % INSTAGRAM_WIDTH
+    return '%s|format-jpeg|jpegquality-85' % resize
+
+
+def get_twitter_filters(image):
+    return ['max-%dx%d|format-jpeg|jpegquality-%d' % (TWITTER_MAX_SIZE, TWITTER_MAX_SIZE, quality)
+            for quality in TWITTER_QUALITIES]
+
+
+def get_rendition(image, channel):
+    """
+    Rendition of the image to post through the channel. Wagtail stores renditions, so after the first call
+    it's a lookup.
+    """
+    if channel == Sharing.SOCIAL_INSTAGRAM:
+        return image.get_rendition(get_instagram_filter(image))
+    if channel == Sharing.SOCIAL_TWITTER:
+        for filter_spec in get_twitter_filters(image):
+            rendition = image.get_rendition(filter_spec)
+            if rendition.file.size <= TWITTER_MAX_BYTES:
+                break
+        return rendition
+    return None
+
+
+def get_sharing_media(sharing, content=None):
+    """
+    Path of the image to post for the sharing, the original image when the channel has no rendition.
+    """
+    if content is None:
+        content = getattr(sharing, sharing.get_object_field())
+    rendition = get_rendition(content.image, sharing.channel)
+    if rendition is None:
+        return content.image_path
+    return rendition.file.path
+
+
+def generate_rendition(sharing):
+    try:
+        get_sharing_media(sharing)
+    except Exception as e:
+        # The publisher generates it again when posting
+        print(e)
+        capture_exception(e)
+
+
+def prepare_sharing(sender, instance, **kwargs):
+    """
+    Generates the rendition of a sharing when it's saved, so publishing doesn't process images.
+    """
+    if instance.published:
+        return
+    transaction.on_commit(lambda: generate_rendition(instance))
+
+
+def connect_signals():
+    for model in Sharing.get_models():
+        post_save.connect(prepare_sharing, sender=model, dispatch_uid='social_prepare_sharing')